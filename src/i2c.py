@@ -4,12 +4,58 @@ args = getArgs()
 
 # start application logic from here!!!
 
-from pkg.ui.appWindow import AppWindow
+
+def start_metrics():
+    """Start the metrics endpoint and file dump requested on the command line, returns the file dumper"""
+    from pkg.core.metrics import MetricsFileDumper, start_metrics_server
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+        print(f"Serving metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+    if args.metrics_file:
+        return MetricsFileDumper(args.metrics_file, args.metrics_interval).start()
+    return None
+
+
+def run_watch_folder():
+    import os
+
+    from pkg.core.recipe import load_recipe
+    from pkg.core.scheduler import JobScheduler
+    from pkg.core.watchFolder import WatchFolder
+
+    if not args.recipe or not args.output:
+        raise SystemExit("--watch needs --recipe and --output")
+    scheduler = JobScheduler()
+    scheduler.configure(workers=args.workers, cv_threads=args.cv_threads, batch_workers=args.batch_workers or args.workers or os.cpu_count())
+    watcher = WatchFolder(args.watch, args.output, load_recipe(args.recipe), ledger_path=args.ledger,
+                          queue_size=args.queue_size, poll_interval=args.poll_interval, scheduler=scheduler)
+    print(f"Watching {args.watch} -> {args.output}")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("Stopping, waiting for files being written")
+    finally:
+        # Queued files are cancelled, running ones finish so no partial temporary files are left behind
+        watcher.close()
+        scheduler.shutdown()
+        print(f"{watcher.processed = } {watcher.failed = }")
+
 
 if __name__ == "__main__":
-    print(f"{args.theme = }")
-    print(f"{args.dpx = }")
-    app = AppWindow()
-    app.state('normal')
-    app.mainloop()
-    
\ No newline at end of file
+    if args.memory_budget:
+        from pkg.core.imageLoader import set_memory_budget
+        set_memory_budget(args.memory_budget << 20)
+    metrics_dumper = start_metrics()
+    if args.watch:
+        run_watch_folder()
+    else:
+        from pkg.ui.appWindow import AppWindow
+
+        print(f"{args.theme = }")
+        print(f"{args.dpx = }")
+        app = AppWindow()
+        app.state('normal')
+        app.mainloop()
+    if metrics_dumper is not None:
+        metrics_dumper.stop()
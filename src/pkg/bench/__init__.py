@@ -0,0 +1,8 @@
+# -----------------------------------------------------------
+# pkg/bench/__init__.py
+# @author: Amit Kshirsagar
+# 
+# (C) 2024 Amit Kshirsagar, Pune, India
+# Released under MIT License (MIT)
+# email amit.kshirsagar.13@gmail.com
+# -----------------------------------------------------------
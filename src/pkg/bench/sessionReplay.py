@@ -0,0 +1,135 @@
+"""
+Headless replay of a recorded GUI session
+
+Replays a log written by `i2c.py --record FILE` against ImageProcessor and
+HistoryManager, renders every selection into display sized buffers like the
+previews do, and writes recorded vs replayed timing percentiles as JSON.
+
+    python -m pkg.bench.sessionReplay session.jsonl --out replay.json
+"""
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+
+from pkg.core.imageProcessUtils import ImageProcessor
+from pkg.core.operations import get_operation
+from pkg.core.renderUtils import render_fit
+from pkg.core.sessionLog import file_hash, read_session
+from pkg.bench.uiLatency import summarize
+
+
+class SessionReplay:
+    """Re-executes session events one after another, mapping recorded node ids to the recreated nodes"""
+    def __init__(self, image=None, verify_hash: bool = True):
+        self.image = image
+        self.verify_hash = verify_hash
+        self.processor = ImageProcessor()
+        self.history_manager = self.processor.history_manager
+        self.nodes = {}
+        self.recorded = defaultdict(list)
+        self.replayed = defaultdict(list)
+        self.warnings = []
+        self._render_buffers = {}
+
+    def _source(self, entry) -> str:
+        path = self.image or entry["file"]
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Session image not found, pass --image: {path}")
+        if self.verify_hash and file_hash(path) != entry["sha256"]:
+            self.warnings.append(f"{entry['event']} at {entry['t']}s: {path} differs from the recorded file")
+        return path
+
+    def _render(self, node, sizes: dict):
+        """Fit the node's input and output display buffers to the recorded preview sizes"""
+        sources = {"input": node.previous_node, "output": node}
+        for role, source in sources.items():
+            if source is None or role not in sizes:
+                continue
+            rgb = source.get_display_buffer()
+            if rgb is not None:
+                self._render_buffers[role] = render_fit(rgb, *sizes[role], dst=self._render_buffers.get(role))
+
+    def on_open(self, entry):
+        self.processor.load_image(self._source(entry))
+        self.nodes[entry["node"]] = self.history_manager.root_node
+
+    def on_rebase(self, entry):
+        self.processor.rebase_tree(self._source(entry)).future.result()
+
+    def on_operation(self, entry):
+        parent = self.nodes[entry["parent"]]
+        operation = get_operation(entry["operation"])
+        image, color_space = operation.prepare_input(parent)
+        started = time.perf_counter()
+        output = operation.run(image, entry.get("parameters"), color_space=color_space)
+        elapsed = time.perf_counter() - started
+        node = self.processor.commit_operation(entry["operation"], output, entry.get("parameters"), parent_node=parent,
+                                               metrics={"duration_ms": round(elapsed * 1000, 1)})
+        self.nodes[entry["node"]] = node
+
+    def on_select(self, entry):
+        node = self.nodes.get(entry["node"])
+        if node is None:
+            self.warnings.append(f"select at {entry['t']}s: node {entry['node']} was not recreated")
+            return
+        self.history_manager.set_selected_node(node)
+        self._render(node, entry)
+
+    def on_layout(self, entry):
+        # Layout only changes the preview sizes, the next selection renders at them
+        pass
+
+    def on_compact(self, entry):
+        getattr(self.history_manager, entry["action"])(self.nodes[entry["node"]])
+        # Removed nodes must not be found again, a later select of one of them is reported as not recreated
+        remaining = set(map(id, self.history_manager.root_node.walk()))
+        self.nodes = {node_id: node for node_id, node in self.nodes.items() if id(node) in remaining}
+
+    def run(self, log_path: str) -> dict:
+        events = 0
+        for entry in read_session(log_path):
+            handler = getattr(self, f"on_{entry['event']}", None)
+            if handler is None:
+                continue
+            started = time.perf_counter()
+            handler(entry)
+            self.replayed[entry["event"]].append(time.perf_counter() - started)
+            if entry.get("duration_ms") is not None:
+                self.recorded[entry["event"]].append(entry["duration_ms"] / 1000)
+            events += 1
+        return {
+            "log": log_path,
+            "events": events,
+            "nodes": len(self.history_manager.index),
+            "recorded_ms": {event: summarize(samples) for event, samples in self.recorded.items()},
+            "replayed_ms": {event: summarize(samples) for event, samples in self.replayed.items()},
+            "warnings": self.warnings,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded session without a display")
+    parser.add_argument("log", help="Session log written with --record")
+    parser.add_argument("--image", help="Use this image instead of the recorded file")
+    parser.add_argument("--no-verify", action="store_true", help="Skip comparing the image hash with the recorded one")
+    parser.add_argument("--out", default="session-replay.json")
+    options = parser.parse_args(argv)
+
+    results = SessionReplay(options.image, verify_hash=not options.no_verify).run(options.log)
+    with open(options.out, "w") as file:
+        json.dump(results, file, indent=2)
+    for event, summary in results["replayed_ms"].items():
+        recorded = results["recorded_ms"].get(event, {})
+        recorded_p50 = f"{recorded['p50']:8.2f}ms" if recorded.get("count") else "       -  "
+        print(f"{event:12s} n={summary['count']:4d} replay p50={summary['p50']:8.2f}ms p99={summary['p99']:8.2f}ms "
+              f"recorded p50={recorded_p50}")
+    for warning in results["warnings"]:
+        print(f"warning: {warning}")
+    ImageProcessor().scheduler.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    main()
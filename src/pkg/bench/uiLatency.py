@@ -0,0 +1,247 @@
+"""
+UI latency benchmark
+
+Launches AppWindow, or TreePreviewComponent on its own, on a virtual X display,
+drives it programmatically and writes event-to-idle latency percentiles as JSON.
+
+    python -m pkg.bench.uiLatency --target tree --size 4000x3000 --operations 20 --out ui-latency.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+OPERATIONS = ["Grayscale", "Blur", "RGB", "Threshold", "Sketch"]
+
+
+def start_virtual_display(display: str = ":99", screen: str = "1920x1080x24"):
+    """Start Xvfb and point DISPLAY at it, returns the Xvfb process"""
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        raise RuntimeError("Xvfb not found, install xvfb or run with an existing DISPLAY")
+    process = subprocess.Popen([xvfb, display, "-screen", "0", screen, "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    socket = f"/tmp/.X11-unix/X{display.lstrip(':')}"
+    deadline = time.time() + 10
+    while not os.path.exists(socket):
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            raise RuntimeError("Xvfb failed to start")
+        time.sleep(0.05)
+    os.environ["DISPLAY"] = display
+    return process
+
+
+def make_synthetic_image(width: int, height: int, folder: str, seed: int = 0) -> str:
+    """Write a gradient, shapes and noise test image, returns its path"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    image = np.dstack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)),
+                       (x + y) / 2]).astype(np.uint8)
+    for _ in range(20):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.circle(image, center, int(rng.integers(10, max(11, min(width, height) // 4))), color, -1)
+    image = cv2.add(image, rng.integers(0, 24, image.shape, dtype=np.uint8))
+    path = os.path.join(folder, f"synthetic_{width}x{height}.png")
+    cv2.imwrite(path, image)
+    return path
+
+
+def summarize(samples) -> dict:
+    """Latency percentiles in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) * 1000,
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": ordered[-1] * 1000,
+    }
+
+
+class LatencyRecorder:
+    """Times actions from the moment they are issued until Tk is idle again"""
+    def __init__(self, root):
+        self.root = root
+        self.samples = defaultdict(list)
+
+    def wait_idle(self, until=None, timeout: float = 120):
+        deadline = time.perf_counter() + timeout
+        while True:
+            self.root.update()
+            if until is None or until():
+                break
+            if time.perf_counter() > deadline:
+                raise TimeoutError("UI did not settle")
+            time.sleep(0.001)
+        self.root.update_idletasks()
+
+    def measure(self, name: str, action, until=None):
+        started = time.perf_counter()
+        action()
+        self.wait_idle(until)
+        self.samples[name].append(time.perf_counter() - started)
+
+    def results(self) -> dict:
+        return {name: summarize(samples) for name, samples in self.samples.items()}
+
+
+class TreeTarget:
+    """TreePreviewComponent on its own window, like its __main__ block"""
+    def __init__(self):
+        import ttkbootstrap as tb
+        from ttkbootstrap.constants import BOTH
+        from pkg.core.imageProcessUtils import ImageProcessor
+        from pkg.ui.components.TreePreviewComponent import TreePreviewComponent
+
+        self.root = tb.Window(themename="darkly")
+        self.root.geometry("1400x900")
+        self.processor = ImageProcessor()
+        self.tree_preview = TreePreviewComponent(self.root, default_position="LEFT")
+        self.tree_preview.pack(fill=BOTH, expand=True)
+
+    def load(self, path):
+        self.processor.load_image(path)
+        self.tree_preview.populate_tree(self.processor.history_manager.root_node)
+
+    def apply(self, operation_name):
+        self.processor.apply_operation(operation_name)
+        self.tree_preview.populate_tree(self.processor.history_manager.root_node)
+
+    def busy(self):
+        return False
+
+
+class AppTarget:
+    """The full AppWindow, operations run through the background scheduler"""
+    def __init__(self):
+        from pkg.utils.cmdArgs import getArgs
+        getArgs([])
+        from pkg.ui.appWindow import AppWindow
+
+        self.root = AppWindow()
+        self.root.geometry("1400x900")
+        self.processor = self.root.image_processor
+        self.tree_preview = self.root.treePreview
+
+    def load(self, path):
+        self.root.load_image(path)
+
+    def apply(self, operation_name):
+        self.root.run_operation(operation_name)
+
+    def busy(self):
+        return self.root.active_job is not None
+
+
+def run_benchmark(options) -> dict:
+    random.seed(options.seed)
+    width, height = (int(value) for value in options.size.lower().split("x"))
+    target = AppTarget() if options.target == "app" else TreeTarget()
+    recorder = LatencyRecorder(target.root)
+    recorder.wait_idle()
+
+    tree_component = target.tree_preview.tree_component
+    preview_component = target.tree_preview.preview_component
+    history_manager = target.processor.history_manager
+
+    def select(node):
+        tree_component.select_node(node)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = make_synthetic_image(width, height, folder, options.seed)
+        recorder.measure("load", lambda: target.load(path))
+
+        for index in range(options.operations):
+            nodes = list(history_manager.root_node.walk())
+            recorder.measure("select_node", lambda: select(random.choice(nodes)))
+            operation_name = OPERATIONS[index % len(OPERATIONS)]
+            recorder.measure("operation", lambda: target.apply(operation_name), until=lambda: not target.busy())
+
+        nodes = list(history_manager.root_node.walk())
+        for _ in range(options.selections):
+            recorder.measure("select_node", lambda: select(random.choice(nodes)))
+
+        paned = target.tree_preview.paned_window
+        for index in range(options.resizes):
+            position = 300 + (index % 2) * 200
+            recorder.measure("sash_drag", lambda: paned.sashpos(0, position))
+            geometry = "1400x900" if index % 2 else "1100x750"
+            recorder.measure("window_resize", lambda: target.root.geometry(geometry))
+            layout = "BOTTOM" if index % 2 == 0 else "RIGHT"
+
+            def switch_layout():
+                preview_component.position_var.set(layout)
+                preview_component.update_preview_layout()
+            recorder.measure("layout_switch", switch_layout)
+
+        # Large history, built directly on the history manager to keep setup cheap
+        small = history_manager.root_node.output[:64, :64]
+        parents = [history_manager.root_node]
+        for index in range(options.history_nodes):
+            parent = random.choice(parents[-50:]) if index % 10 else history_manager.root_node
+            parents.append(history_manager.add_processing_step(small, "Synthetic", {"index": index}, parent_node=parent))
+        recorder.measure("populate_tree", lambda: target.tree_preview.populate_tree(history_manager.root_node))
+        recorder.measure("select_node_large_history", lambda: select(parents[-1]))
+
+    from pkg.core.scheduler import JobScheduler
+    results = {
+        "target": options.target,
+        "image_size": [width, height],
+        "operations": options.operations,
+        "history_nodes": options.history_nodes,
+        "latency_ms": recorder.results(),
+        "render": preview_component.render_stats(),
+        "scheduler": JobScheduler().stats(),
+    }
+    target.root.destroy()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure UI event-to-idle latencies")
+    parser.add_argument("--target", choices=["app", "tree"], default="tree")
+    parser.add_argument("--size", default="4000x3000", help="Synthetic image size, WIDTHxHEIGHT")
+    parser.add_argument("--operations", type=int, default=10)
+    parser.add_argument("--selections", type=int, default=50)
+    parser.add_argument("--resizes", type=int, default=10)
+    parser.add_argument("--history-nodes", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--xvfb", action="store_true", help="Always start Xvfb, even if DISPLAY is set")
+    parser.add_argument("--display", default=":99")
+    parser.add_argument("--out", default="ui-latency.json")
+    options = parser.parse_args(argv)
+
+    xvfb = None
+    if options.xvfb or not os.environ.get("DISPLAY"):
+        xvfb = start_virtual_display(options.display)
+    try:
+        results = run_benchmark(options)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+    with open(options.out, "w") as file:
+        json.dump(results, file, indent=2)
+    for name, summary in results["latency_ms"].items():
+        print(f"{name:28s} n={summary['count']:4d} p50={summary['p50']:8.2f}ms p90={summary['p90']:8.2f}ms p99={summary['p99']:8.2f}ms")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+
+BGR = "BGR"
+RGB = "RGB"
+GRAY = "GRAY"
+BGRA = "BGRA"
+RGBA = "RGBA"
+
+_CONVERSIONS = {
+    (BGR, RGB): cv2.COLOR_BGR2RGB,
+    (RGB, BGR): cv2.COLOR_RGB2BGR,
+    (BGR, GRAY): cv2.COLOR_BGR2GRAY,
+    (RGB, GRAY): cv2.COLOR_RGB2GRAY,
+    (GRAY, BGR): cv2.COLOR_GRAY2BGR,
+    (GRAY, RGB): cv2.COLOR_GRAY2RGB,
+    (BGRA, BGR): cv2.COLOR_BGRA2BGR,
+    (BGRA, RGB): cv2.COLOR_BGRA2RGB,
+    (BGRA, GRAY): cv2.COLOR_BGRA2GRAY,
+    (BGRA, RGBA): cv2.COLOR_BGRA2RGBA,
+    (RGBA, RGB): cv2.COLOR_RGBA2RGB,
+    (RGBA, BGR): cv2.COLOR_RGBA2BGR,
+    (RGBA, GRAY): cv2.COLOR_RGBA2GRAY,
+    (RGBA, BGRA): cv2.COLOR_RGBA2BGRA,
+    (BGR, BGRA): cv2.COLOR_BGR2BGRA,
+    (RGB, RGBA): cv2.COLOR_RGB2RGBA,
+    (GRAY, BGRA): cv2.COLOR_GRAY2BGRA,
+    (GRAY, RGBA): cv2.COLOR_GRAY2RGBA,
+}
+
+# Channel reorders that can be undone without losing information
+REVERSIBLE = {(BGR, RGB), (RGB, BGR), (BGRA, RGBA), (RGBA, BGRA)}
+
+
+def guess_color_space(image) -> str:
+    """Guess the color space of an OpenCV buffer from its channel count"""
+    if image.ndim == 2 or image.shape[2] == 1:
+        return GRAY
+    if image.shape[2] == 4:
+        return BGRA
+    return BGR
+
+
+def convert_color(image, source: str, target: str):
+    """Convert between color spaces, returning the same buffer when there is nothing to do"""
+    if source == target:
+        return image
+    if (source, target) not in _CONVERSIONS:
+        raise ValueError(f"Unsupported color conversion: {source} -> {target}")
+    return cv2.cvtColor(image, _CONVERSIONS[(source, target)])
+
+
+def to_uint8(image):
+    """Scale higher bit depth or float buffers to 8 bit for display"""
+    if image.dtype == np.uint8:
+        return image
+    if image.dtype == np.uint16:
+        return (image >> 8).astype(np.uint8)
+    if np.issubdtype(image.dtype, np.floating):
+        return (np.clip(image, 0.0, 1.0) * 255).astype(np.uint8)
+    return cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+
+
+def decimate(image, max_size: int):
+    """Shrink an image so its longest side is at most max_size, reading only the rows and columns it keeps"""
+    h, w = image.shape[:2]
+    if max(h, w) <= max_size:
+        return image
+    step = max(h, w) // max_size
+    # A strided view only touches the pixels it keeps, mapped files are not paged in completely
+    image = np.ascontiguousarray(image[::step, ::step])
+    h, w = image.shape[:2]
+    scale = max_size / max(h, w)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def to_display_rgb(image, color_space: str = None, max_size: int = None):
+    """Get an 8 bit, contiguous RGB version of a buffer for Tk/PIL, at most max_size on its longest side"""
+    color_space = color_space or guess_color_space(image)
+    if image.ndim == 3 and image.shape[2] == 1:
+        image = image[:, :, 0]
+    if max_size is not None:
+        image = decimate(image, max_size)
+    rgb = convert_color(to_uint8(image), color_space, RGB)
+    return np.ascontiguousarray(rgb)
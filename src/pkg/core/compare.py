@@ -0,0 +1,266 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from .scheduler import JobScheduler, Priority
+
+# SSIM constants for 8 bit data, Gaussian window of 11 pixels with sigma 1.5
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+_SSIM_WINDOW = 11
+_SSIM_SIGMA = 1.5
+
+
+@dataclass
+class ComparisonResult:
+    """Difference statistics of two display buffers and their difference heatmap"""
+    shape: tuple
+    mse: float
+    psnr: float  # inf for identical images
+    ssim: float
+    changed_pixels: int
+    changed_ratio: float
+    max_diff: int
+    heatmap: np.ndarray  # RGB
+    elapsed: float
+    resized: bool = False  # second image was resized to the first one's size
+
+
+def _ssim_sum(gray_a, gray_b, start: int, stop: int) -> float:
+    """Sum of the SSIM map over rows start:stop of strips that include their halo rows"""
+    blur = lambda image: cv2.GaussianBlur(image, (_SSIM_WINDOW, _SSIM_WINDOW), _SSIM_SIGMA)
+    mu_a, mu_b = blur(gray_a), blur(gray_b)
+    mu_aa, mu_bb, mu_ab = mu_a * mu_a, mu_b * mu_b, mu_a * mu_b
+    sigma_a = blur(gray_a * gray_a) - mu_aa
+    sigma_b = blur(gray_b * gray_b) - mu_bb
+    sigma_ab = blur(gray_a * gray_b) - mu_ab
+    ssim_map = ((2 * mu_ab + _C1) * (2 * sigma_ab + _C2)) / ((mu_aa + mu_bb + _C1) * (sigma_a + sigma_b + _C2))
+    return float(ssim_map[start:stop].sum(dtype=np.float64))
+
+
+# Inferno colormap with the channels in RGB order, so the heatmap needs no conversion
+_HEATMAP_LUT = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), cv2.COLORMAP_INFERNO)[:, :, ::-1].copy()
+
+
+def _channel_max(diff):
+    if diff.ndim == 2:
+        return diff
+    channels = cv2.split(diff)
+    result = channels[0]
+    for channel in channels[1:]:
+        result = cv2.max(result, channel)
+    return result
+
+
+def _compare_strip(rgb_a, rgb_b, heatmap, y0: int, y1: int, threshold: int):
+    """Statistics of rows y0:y1, writes the heatmap rows in place"""
+    a, b = rgb_a[y0:y1], rgb_b[y0:y1]
+    squared = cv2.norm(a, b, cv2.NORM_L2SQR)
+    diff_max = _channel_max(cv2.absdiff(a, b))
+    cv2.applyColorMap(diff_max, _HEATMAP_LUT, dst=heatmap[y0:y1])
+    changed = cv2.threshold(diff_max, threshold, 255, cv2.THRESH_BINARY)[1] if threshold else diff_max
+
+    # SSIM on luma, with enough rows around the strip for the Gaussian window
+    halo = _SSIM_WINDOW // 2
+    top, bottom = max(0, y0 - halo), min(rgb_a.shape[0], y1 + halo)
+    gray_a = cv2.cvtColor(rgb_a[top:bottom], cv2.COLOR_RGB2GRAY).astype(np.float32)
+    gray_b = cv2.cvtColor(rgb_b[top:bottom], cv2.COLOR_RGB2GRAY).astype(np.float32)
+    return (
+        float(squared),
+        _ssim_sum(gray_a, gray_b, y0 - top, y1 - top),
+        cv2.countNonZero(changed),
+        int(cv2.minMaxLoc(diff_max)[1]),
+    )
+
+
+class CompareJob:
+    """
+    Compares two RGB display buffers strip by strip on the job scheduler.
+
+    Strips run concurrently, each one accumulating its squared error, SSIM
+    sum and changed pixel count and writing its rows of the heatmap. The
+    future resolves with a ComparisonResult once the last strip finished.
+    """
+    def __init__(self, rgb_a, rgb_b, scheduler: Optional[JobScheduler] = None, strip_height: int = 256,
+                 threshold: int = 0, priority: Priority = Priority.INTERACTIVE, resized: bool = False):
+        # resized tells that B was already resized to A by the caller, e.g. through display_pair
+        self.resized = resized or rgb_a.shape[:2] != rgb_b.shape[:2]
+        if rgb_a.shape[:2] != rgb_b.shape[:2]:
+            rgb_b = _resize_to(rgb_b, rgb_a)
+        self.rgb_a, self.rgb_b = rgb_a, rgb_b
+        self.scheduler = scheduler or JobScheduler()
+        self.strip_height = strip_height
+        self.threshold = threshold
+        self.priority = priority
+        self.future = Future()
+        self.heatmap = np.empty(rgb_a.shape[:2] + (3,), dtype=np.uint8)
+        self._parts = []
+        self._remaining = 0
+        self._lock = threading.Lock()
+        self._started = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        height = self.rgb_a.shape[0]
+        strips = [(y0, min(y0 + self.strip_height, height)) for y0 in range(0, height, self.strip_height)]
+        self._remaining = len(strips)
+        for y0, y1 in strips:
+            future = self.scheduler.submit(self.priority, _compare_strip, self.rgb_a, self.rgb_b,
+                                           self.heatmap, y0, y1, self.threshold)
+            future.add_done_callback(self._strip_done)
+        return self
+
+    def _strip_done(self, future):
+        error = future.exception() if not future.cancelled() else RuntimeError("Comparison cancelled")
+        with self._lock:
+            if error is None:
+                self._parts.append(future.result())
+            self._remaining -= 1
+            if self.future.done():
+                return
+            if error is not None:
+                self.future.set_exception(error)
+            elif self._remaining == 0:
+                self.future.set_result(self._result())
+
+    def _result(self) -> ComparisonResult:
+        height, width = self.rgb_a.shape[:2]
+        pixels = height * width
+        channels = self.rgb_a.shape[2] if self.rgb_a.ndim == 3 else 1
+        squared = sum(part[0] for part in self._parts)
+        mse = squared / max(pixels * channels, 1)
+        changed = sum(part[2] for part in self._parts)
+        return ComparisonResult(
+            shape=(height, width),
+            mse=mse,
+            psnr=math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse),
+            ssim=sum(part[1] for part in self._parts) / max(pixels, 1),
+            changed_pixels=changed,
+            changed_ratio=changed / max(pixels, 1),
+            max_diff=max((part[3] for part in self._parts), default=0),
+            heatmap=self.heatmap,
+            elapsed=time.perf_counter() - self._started,
+            resized=self.resized,
+        )
+
+
+class ComparisonCache:
+    """
+    LRU of comparison results per node pair, invalidated when either output changes.
+
+    Every result holds a full resolution heatmap, so the cache is bounded by
+    the bytes of those heatmaps rather than by a number of entries.
+    """
+    def __init__(self, capacity_bytes: int = 256 << 20):
+        self.capacity_bytes = capacity_bytes
+        self.size_bytes = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(node_a, node_b) -> tuple:
+        return (node_a.node_id, node_a.version, node_b.node_id, node_b.version)
+
+    def get(self, node_a, node_b) -> Optional[ComparisonResult]:
+        with self._lock:
+            result = self._results.get(self.key(node_a, node_b))
+            if result is not None:
+                self._results.move_to_end(self.key(node_a, node_b))
+            return result
+
+    def put(self, node_a, node_b, result: ComparisonResult):
+        size = result.heatmap.nbytes
+        if size > self.capacity_bytes:
+            return
+        with self._lock:
+            previous = self._results.pop(self.key(node_a, node_b), None)
+            if previous is not None:
+                self.size_bytes -= previous.heatmap.nbytes
+            self._results[self.key(node_a, node_b)] = result
+            self.size_bytes += size
+            while self.size_bytes > self.capacity_bytes:
+                _, evicted = self._results.popitem(last=False)
+                self.size_bytes -= evicted.heatmap.nbytes
+
+    def forget(self, node_ids):
+        """Drop every result involving one of the nodes, e.g. after they were deleted from history"""
+        node_ids = set(node_ids)
+        with self._lock:
+            for key in [key for key in self._results if key[0] in node_ids or key[2] in node_ids]:
+                self.size_bytes -= self._results.pop(key).heatmap.nbytes
+
+
+_cache = ComparisonCache()
+
+
+def forget_nodes(node_ids):
+    """Drop cached comparisons of removed nodes"""
+    _cache.forget(node_ids)
+
+
+def _resize_to(rgb, reference):
+    return cv2.resize(rgb, (reference.shape[1], reference.shape[0]), interpolation=cv2.INTER_AREA)
+
+
+def display_pair(node_a, node_b) -> tuple:
+    """
+    Display buffers of two nodes at the same size, B is resized to A when the sizes differ
+
+    Returns:
+        tuple: (RGB of A, RGB of B, whether B was resized)
+    """
+    rgb_a, rgb_b = node_a.get_display_buffer(), node_b.get_display_buffer()
+    if rgb_a is None or rgb_b is None:
+        raise ValueError("Both nodes need an output to compare")
+    resized = rgb_a.shape[:2] != rgb_b.shape[:2]
+    return rgb_a, _resize_to(rgb_b, rgb_a) if resized else rgb_b, resized
+
+
+def compare_nodes(node_a, node_b, scheduler: Optional[JobScheduler] = None, pair: Optional[tuple] = None) -> Future:
+    """
+    Compare the display buffers of two nodes, reusing a cached result for the same pair
+
+    Args:
+        pair: display_pair result when the caller already has it, built on the scheduler otherwise
+
+    Returns:
+        Future: resolves to a ComparisonResult
+    """
+    future = Future()
+    cached = _cache.get(node_a, node_b)
+    if cached is not None:
+        future.set_result(cached)
+        return future
+    scheduler = scheduler or JobScheduler()
+
+    def compared(job_future):
+        if job_future.exception() is not None:
+            future.set_exception(job_future.exception())
+            return
+        _cache.put(node_a, node_b, job_future.result())
+        future.set_result(job_future.result())
+
+    def start(pair_future):
+        if pair_future.cancelled():
+            future.cancel()
+            return
+        if pair_future.exception() is not None:
+            future.set_exception(pair_future.exception())
+            return
+        rgb_a, rgb_b, resized = pair_future.result()
+        CompareJob(rgb_a, rgb_b, scheduler, resized=resized).start().future.add_done_callback(compared)
+
+    if pair is not None:
+        ready = Future()
+        ready.set_result(pair)
+        start(ready)
+    else:
+        scheduler.submit(Priority.INTERACTIVE, display_pair, node_a, node_b).add_done_callback(start)
+    return future
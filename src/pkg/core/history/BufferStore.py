@@ -0,0 +1,160 @@
+import inspect
+import threading
+import weakref
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import lz4.frame as _lz4
+except ImportError:  # lz4 is optional, zlib level 1 is the fallback codec
+    _lz4 = None
+
+
+@dataclass
+class StoredBuffer:
+    """Compressed representation of a node buffer"""
+    blob: bytes
+    shape: Tuple[int, ...]
+    dtype: str
+    raw_size: int
+
+    @property
+    def compressed_size(self) -> int:
+        return len(self.blob)
+
+    @property
+    def ratio(self) -> float:
+        return self.raw_size / max(self.compressed_size, 1)
+
+
+class BufferStore:
+    """
+    Two tier storage for node buffers.
+
+    Hot buffers are kept as raw numpy arrays in a small LRU. When a buffer
+    falls out of the LRU it is compressed losslessly and only the compressed
+    bytes are kept in memory. Reading a cold buffer decompresses it back into
+    the hot tier.
+    """
+    def __init__(self, hot_capacity: int = 8, level: int = 1):
+        self.hot_capacity = max(1, hot_capacity)
+        self.level = level
+        self.codec = "lz4" if _lz4 is not None else "zlib"
+        self._hot: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._cold: Dict[int, StoredBuffer] = {}
+        self._on_evict: Dict[int, Callable[[], Optional[Callable]]] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def _compress(self, array: np.ndarray) -> StoredBuffer:
+        data = np.ascontiguousarray(array)
+        if _lz4 is not None:
+            blob = _lz4.compress(data, compression_level=self.level)
+        else:
+            blob = zlib.compress(data, self.level)
+        return StoredBuffer(blob=blob, shape=data.shape, dtype=data.dtype.str, raw_size=data.nbytes)
+
+    def _decompress(self, stored: StoredBuffer) -> np.ndarray:
+        if _lz4 is not None:
+            raw = _lz4.decompress(stored.blob)
+        else:
+            raw = zlib.decompress(stored.blob)
+        array = np.frombuffer(raw, dtype=np.dtype(stored.dtype)).reshape(stored.shape)
+        # frombuffer views immutable bytes, node buffers are treated as read-only anyway
+        array.flags.writeable = False
+        return array
+
+    def _touch(self, key: int, array: np.ndarray):
+        self._hot[key] = array
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_capacity:
+            old_key, old_array = self._hot.popitem(last=False)
+            if old_key not in self._cold:
+                self._cold[old_key] = self._compress(old_array)
+            ref = self._on_evict.get(old_key)
+            callback = ref() if ref is not None else None
+            if callback is not None:
+                callback()
+
+    def put(self, key: int, array: np.ndarray, on_evict: Optional[Callable] = None):
+        """Store a new buffer in the hot tier, on_evict is called whenever it goes cold"""
+        with self._lock:
+            if on_evict is not None:
+                # Bound methods are held weakly, the store must not keep a forgotten node alive
+                self._on_evict[key] = weakref.WeakMethod(on_evict) if inspect.ismethod(on_evict) else lambda: on_evict
+            self._cold.pop(key, None)
+            self._touch(key, array)
+
+    def get(self, key: int) -> Optional[np.ndarray]:
+        """Get a buffer, decompressing it into the hot tier if it is cold"""
+        with self._lock:
+            array = self._hot.get(key)
+            if array is not None:
+                self.hits += 1
+                self._hot.move_to_end(key)
+                return array
+            stored = self._cold.get(key)
+            if stored is None:
+                return None
+            self.misses += 1
+            array = self._decompress(stored)
+            self._touch(key, array)
+            return array
+
+    def discard(self, key: int) -> int:
+        """Remove a buffer from both tiers, returns the number of bytes released"""
+        array, cold_bytes = self.remove(key)
+        return cold_bytes + (array.nbytes if array is not None else 0)
+
+    def remove(self, key: int) -> Tuple[Optional[np.ndarray], int]:
+        """
+        Remove a buffer from both tiers
+
+        Returns:
+            tuple: (hot array or None, compressed bytes released)
+        """
+        with self._lock:
+            self._on_evict.pop(key, None)
+            array = self._hot.pop(key, None)
+            stored = self._cold.pop(key, None)
+            return array, stored.compressed_size if stored is not None else 0
+
+    def peek(self, key: int) -> Optional[np.ndarray]:
+        """Get a hot buffer without decompressing or touching the LRU order"""
+        with self._lock:
+            return self._hot.get(key)
+
+    def compression_info(self, key: int) -> Optional[StoredBuffer]:
+        """Get compressed details for a key, None while it was never evicted from the hot tier"""
+        with self._lock:
+            return self._cold.get(key)
+
+    def __contains__(self, key: int) -> bool:
+        with self._lock:
+            return key in self._hot or key in self._cold
+
+    def is_hot(self, key: int) -> bool:
+        with self._lock:
+            return key in self._hot
+
+    def stats(self) -> dict:
+        """Get memory usage of both tiers"""
+        with self._lock:
+            hot_bytes = sum(a.nbytes for k, a in self._hot.items())
+            cold_bytes = sum(s.compressed_size for k, s in self._cold.items() if k not in self._hot)
+            raw_bytes = sum(s.raw_size for s in self._cold.values())
+            return {
+                "codec": self.codec,
+                "hot_buffers": len(self._hot),
+                "cold_buffers": len(self._cold) - sum(1 for k in self._cold if k in self._hot),
+                "hot_bytes": hot_bytes,
+                "cold_bytes": cold_bytes,
+                "ratio": raw_bytes / max(sum(s.compressed_size for s in self._cold.values()), 1),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,110 @@
+import bisect
+import threading
+from collections import defaultdict
+from typing import Dict, List, Set
+
+from .ImageNode import ImageNode
+
+
+class HistoryIndex:
+    """
+    Inverted index over the history tree.
+
+    Every node is tokenized from its operation name, parameter keys and
+    values, timestamp and metrics. A query is split on whitespace and each
+    term matches tokens by prefix; a node matches when all terms match.
+    """
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._tokens_by_node: Dict[int, Set[str]] = {}
+        self._nodes: Dict[int, ImageNode] = {}
+        self._sorted_tokens: List[str] = []
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def tokenize(node: ImageNode) -> Set[str]:
+        details = node.operation_details
+        tokens = {details.operation_name.lower()}
+        timestamp = details.timestamp
+        tokens.add(timestamp.strftime("%Y-%m-%d"))
+        tokens.add(timestamp.strftime("%H:%M:%S"))
+        parameters = list((details.parameters or {}).items())
+        while parameters:
+            key, value = parameters.pop()
+            if key == "steps" and isinstance(value, list):
+                # Collapsed chains are found by the operations and parameters of their steps
+                for step in value:
+                    tokens.add(str(step["operation"]).lower())
+                    parameters.extend((step.get("parameters") or {}).items())
+                continue
+            key, value = str(key).lower(), str(value).lower()
+            tokens.update((key, value, f"{key}={value}"))
+        for key, value in node.metrics.items():
+            key, value = str(key).lower(), str(value).lower()
+            tokens.update((value, f"{key}={value}"))
+        return tokens
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._tokens_by_node.clear()
+            self._nodes.clear()
+            self._sorted_tokens = []
+
+    def add(self, node: ImageNode):
+        """Index a node, or re-index it if it is already known"""
+        with self._lock:
+            self.remove(node)
+            tokens = self.tokenize(node)
+            self._tokens_by_node[node.node_id] = tokens
+            self._nodes[node.node_id] = node
+            for token in tokens:
+                postings = self._postings[token]
+                if not postings:
+                    bisect.insort(self._sorted_tokens, token)
+                postings.add(node.node_id)
+
+    update = add
+
+    def remove(self, node: ImageNode):
+        with self._lock:
+            tokens = self._tokens_by_node.pop(node.node_id, None)
+            self._nodes.pop(node.node_id, None)
+            for token in tokens or ():
+                postings = self._postings[token]
+                postings.discard(node.node_id)
+                if not postings:
+                    del self._postings[token]
+                    index = bisect.bisect_left(self._sorted_tokens, token)
+                    del self._sorted_tokens[index]
+
+    def rebuild(self, root: ImageNode):
+        with self._lock:
+            self.clear()
+            for node in root.walk():
+                self.add(node)
+
+    def _match_term(self, term: str) -> Set[int]:
+        matches = set()
+        index = bisect.bisect_left(self._sorted_tokens, term)
+        while index < len(self._sorted_tokens) and self._sorted_tokens[index].startswith(term):
+            matches |= self._postings[self._sorted_tokens[index]]
+            index += 1
+        return matches
+
+    def search(self, query: str) -> List[ImageNode]:
+        """Get the nodes matching every term of the query, in creation order"""
+        terms = query.lower().split()
+        if not terms:
+            return []
+        with self._lock:
+            result = None
+            for term in sorted(terms, key=len, reverse=True):
+                matches = self._match_term(term)
+                result = matches if result is None else result & matches
+                if not result:
+                    return []
+            return [self._nodes[node_id] for node_id in sorted(result)]
+
+    def __len__(self):
+        return len(self._nodes)
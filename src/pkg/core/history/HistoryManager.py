@@ -1,50 +1,267 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pkg.utils.Singleton import Singleton
-from .ImageNode import ImageNode, ProcessingDetails
-import cv2
+from .ImageNode import ImageNode, ProcessingDetails, buffer_owner
+from .BufferStore import BufferStore
+from .HistoryIndex import HistoryIndex
+from ..compare import forget_nodes
+from ..imageLoader import open_image
+from ..metrics import MetricsRegistry
+
+NODES_ADDED = MetricsRegistry().counter("i2c_history_nodes_added_total", "Processing steps added to history")
+NODES_REMOVED = MetricsRegistry().counter("i2c_history_nodes_removed_total", "Nodes removed by deleting or compacting history")
+BYTES_RECLAIMED = MetricsRegistry().counter("i2c_history_reclaimed_bytes_total", "Buffer bytes released by deleting or compacting history")
 
 class HistoryManager(metaclass=Singleton):
     def __init__(self):
         self.root_node: Optional[ImageNode] = None
         self.current_node: Optional[ImageNode] = None
         self.selected_node: Optional[ImageNode] = None  # New attribute to track selected node
+        self.selected_nodes: List[ImageNode] = []  # Every node selected in the tree, for batch operations
+        self.buffer_store: Optional[BufferStore] = None
+        self.index = HistoryIndex()
+        self.open_plan = None  # How the root image was opened, see imageLoader.plan_open
+        MetricsRegistry().register_collector("history", self._collect_metrics)
+
+    def _collect_metrics(self):
+        yield "i2c_history_nodes", "gauge", "Nodes in the history tree", {}, len(self.index)
+        if self.buffer_store is None:
+            return
+        stats = self.buffer_store.stats()
+        yield "i2c_buffer_store_bytes", "gauge", "History buffer memory, raw resident or compressed spilled", {"tier": "resident"}, stats["hot_bytes"]
+        yield "i2c_buffer_store_bytes", "gauge", "History buffer memory, raw resident or compressed spilled", {"tier": "spilled"}, stats["cold_bytes"]
+        yield "i2c_buffer_store_buffers", "gauge", "History buffers per tier", {"tier": "resident"}, stats["hot_buffers"]
+        yield "i2c_buffer_store_buffers", "gauge", "History buffers per tier", {"tier": "spilled"}, stats["cold_buffers"]
+        yield "i2c_buffer_store_hits_total", "counter", "Buffer reads served from the resident tier", {}, stats["hits"]
+        yield "i2c_buffer_store_misses_total", "counter", "Buffer reads that decompressed a spilled buffer", {}, stats["misses"]
+
+    def enable_buffer_compression(self, hot_capacity: int = 8):
+        """Keep cold node buffers compressed in memory, with a small LRU of raw hot buffers"""
+        if self.buffer_store is None:
+            self.buffer_store = BufferStore(hot_capacity=hot_capacity)
+        else:
+            self.buffer_store.hot_capacity = max(1, hot_capacity)
+
+    def _store_node(self, node: ImageNode):
+        """Hand the node buffers over to the buffer store when compression is enabled"""
+        if self.buffer_store is not None:
+            node.attach_store(self.buffer_store)
     
+    def _open_metrics(self) -> dict:
+        plan = self.open_plan
+        metrics = {"open": plan.strategy, "source_size": f"{plan.header.width}x{plan.header.height}"}
+        if plan.scale > 1:
+            metrics["open_scale"] = f"1/{plan.scale}"
+        return metrics
+
     def start_new_chain(self, input_file: str):
         """Initialize a new processing chain with original input file"""
         details = ProcessingDetails(
             operation_name="Original",
             timestamp=datetime.now()
         )
-        output = cv2.imread(input_file)
+        # The header is probed first, uncompressed rasters are memory mapped, large JPEGs decoded reduced
+        output, color_space, self.open_plan = open_image(input_file)
+        if self.buffer_store is not None:
+            # Start from an empty store, the previous tree's buffers are dropped together with it
+            self.buffer_store = BufferStore(hot_capacity=self.buffer_store.hot_capacity, level=self.buffer_store.level)
+        if self.root_node is not None:
+            forget_nodes(node.node_id for node in self.root_node.walk())
         # Create the root node with the original image
-        self.root_node = ImageNode(input=None, output=output, operation_details=details)
+        self.root_node = ImageNode(input=None, output=output, operation_details=details, color_space=color_space)
         self.root_node.set_input_file(input_file)
+        self.root_node.update_metrics(**self._open_metrics())
+        self._store_node(self.root_node)
+        self.index.clear()
+        self.index.add(self.root_node)
         self.current_node = self.root_node
         self.selected_node = self.root_node  # Initialize selected node
+        self.selected_nodes = [self.root_node]
         
-    def add_processing_step(self, output: any, operation: str, parameters: dict = None):
-        """Add a new processing step to the chain"""
+    def rebase_root(self, input_file: str):
+        """
+        Swap the root buffer for a new source image, keeping the tree topology
+        and processing details. Every descendant is marked pending until it is
+        recomputed.
+        """
+        if not self.root_node:
+            raise ValueError("No active processing chain")
+        output, color_space, self.open_plan = open_image(input_file)
+        for node in self.root_node.walk():
+            if node is not self.root_node:
+                node.output = None
+                node.pending = True
+        self.root_node.output = output
+        self.root_node.color_space = color_space
+        self.root_node.set_input_file(input_file)
+        self.root_node.update_metrics(**self._open_metrics())
+        self.index.update(self.root_node)
+        return self.root_node
+
+    def add_processing_step(self, output: any, operation: str, parameters: dict = None, parent_node: Optional[ImageNode] = None,
+                            color_space: str = None, reversible: bool = False, metrics: dict = None):
+        """Add a new processing step to the chain, under parent_node or the active node"""
         if not self.current_node:
             raise ValueError("No active processing chain")
             
-        parent_node = self.selected_node or self.current_node  # Create new node using current or selected node as parent
+        parent_node = parent_node or self.selected_node or self.current_node  # Create new node using current or selected node as parent
         details = ProcessingDetails(
             operation_name=operation,
             timestamp=datetime.now(),
             parameters=parameters
         )
         
+        # Input is resolved through the parent, so no extra reference to its buffer is kept
         new_node = ImageNode(
-            input=parent_node.output,
+            input=None,
             output=output,
-            operation_details=details
+            operation_details=details,
+            color_space=color_space
         )
+        new_node.reversible = reversible
+        new_node.update_metrics(**(metrics or {}))
         
         parent_node.add_next_node(new_node)
+        self._store_node(new_node)
+        self.index.add(new_node)
+        NODES_ADDED.inc()
         self.current_node = new_node
         self.selected_node = new_node  # Update selected node
-        
+        self.selected_nodes = [new_node]
+        return new_node
+
+    def _release_nodes(self, nodes: List[ImageNode]) -> int:
+        """Forget detached nodes everywhere and release their buffers, returns the bytes released"""
+        # Buffers still referenced by the remaining tree, e.g. by no-op steps, are not freed
+        counted = set()
+        if self.root_node is not None:
+            for kept in self.root_node.walk():
+                counted.update(id(buffer_owner(buffer)) for buffer in kept.held_buffers())
+        released = 0
+        for node in nodes:
+            self.index.remove(node)
+            released += node.release_buffers(counted)
+        removed = set(map(id, nodes))
+        self.selected_nodes = [node for node in self.selected_nodes if id(node) not in removed]
+        forget_nodes(node.node_id for node in nodes)
+        NODES_REMOVED.inc(len(nodes))
+        BYTES_RECLAIMED.inc(released)
+        return released
+
+    def _fall_back_to(self, node: ImageNode, removed: List[ImageNode]):
+        """Point current and selected nodes that were removed at node"""
+        removed = set(map(id, removed))
+        if id(self.current_node) in removed:
+            self.current_node = node
+        remaining = [selected for selected in self.selected_nodes if id(selected) not in removed]
+        shown = node if id(self.selected_node) in removed else self.selected_node
+        if shown is None:
+            self.set_selected_nodes(remaining)
+        else:
+            # The shown node leads the selection, like after set_selected_nodes
+            self.set_selected_nodes([shown] + [selected for selected in remaining if selected is not shown])
+
+    def delete_branch(self, node: ImageNode) -> int:
+        """
+        Delete a node and everything below it
+
+        Returns:
+            int: bytes released
+        """
+        if node is self.root_node or node.previous_node is None:
+            raise ValueError("The original image can not be deleted")
+        parent = node.previous_node
+        node.detach()
+        removed = list(node.walk())
+        released = self._release_nodes(removed)
+        self._fall_back_to(parent, removed)
+        return released
+
+    def keep_path(self, node: ImageNode) -> int:
+        """
+        Delete every node that is not on the path from the root to node, including its descendants
+
+        Returns:
+            int: bytes released
+        """
+        path = []
+        current = node
+        while current is not None:
+            path.append(current)
+            current = current.previous_node
+        if path[-1] is not self.root_node:
+            raise ValueError("Node is not part of the current history")
+        on_path = set(map(id, path))
+        removed = []
+        for keep in path:
+            for child in list(keep.next_nodes):
+                if id(child) not in on_path:
+                    child.detach()
+                    removed.extend(child.walk())
+        released = self._release_nodes(removed)
+        self._fall_back_to(node, removed)
+        return released
+
+    def collapse_chain(self, node: ImageNode) -> int:
+        """
+        Collapse the linear chain ending at node into node itself
+
+        The chain runs up from node through parents that have no other
+        children. node keeps its output and becomes a single "Chain" step
+        holding every step of the chain, the intermediate nodes are removed.
+
+        Returns:
+            int: bytes released
+        """
+        first = node
+        while (first.previous_node is not None and first.previous_node is not self.root_node
+               and len(first.previous_node.next_nodes) == 1):
+            first = first.previous_node
+        if first is node or node is self.root_node:
+            raise ValueError("Nothing to collapse, the node has no single child parents")
+
+        chain = []
+        current = node
+        while current is not first.previous_node:
+            chain.append(current)
+            current = current.previous_node
+        chain.reverse()
+        steps = []
+        for step_node in chain:
+            details = step_node.operation_details
+            if details.operation_name == "Chain":
+                steps.extend(details.parameters["steps"])
+            else:
+                steps.append({"operation": details.operation_name, "parameters": details.parameters or {}})
+        duration = sum(step_node.metrics.get("duration_ms", 0) for step_node in chain)
+
+        # node takes the place of first under the chain's parent
+        parent = first.previous_node
+        siblings = parent.next_nodes
+        siblings[siblings.index(first)] = node
+        node.previous_node.next_nodes.remove(node)
+        node.previous_node = parent
+        node.operation_details = ProcessingDetails(
+            operation_name="Chain",
+            timestamp=node.operation_details.timestamp,
+            parameters={"steps": steps}
+        )
+        node.reversible = False
+        node.update_metrics(duration_ms=round(duration, 1), steps=len(steps))
+        self.index.update(node)
+
+        removed = chain[:-1]
+        for removed_node in removed:
+            removed_node.previous_node = None
+            removed_node.next_nodes = []
+        released = self._release_nodes(removed)
+        self._fall_back_to(node, removed)
+        return released
+
+    def search(self, query: str):
+        """Find nodes by operation, parameters, timestamp or metrics"""
+        return self.index.search(query)
+
     def get_current_chain(self):
         """Get the current processing chain"""
         if self.current_node:
@@ -54,6 +271,19 @@ class HistoryManager(metaclass=Singleton):
     def set_selected_node(self, node: ImageNode):
         """Set the currently selected node in the history tree"""
         self.selected_node = node
+        self.selected_nodes = [node] if node is not None else []
+
+    def set_selected_nodes(self, nodes: List[ImageNode]):
+        """Set every selected node, the first one stays the node shown and used by single node operations"""
+        self.selected_nodes = list(nodes)
+        self.selected_node = self.selected_nodes[0] if self.selected_nodes else None
+
+    def get_target_nodes(self) -> List[ImageNode]:
+        """Nodes a batch operation applies to, the active node when nothing is selected"""
+        if self.selected_nodes:
+            return list(self.selected_nodes)
+        active = self.get_active_node()
+        return [active] if active else []
     
     def get_active_node(self):
         """Get the node that should be used for processing (selected or current)"""
@@ -61,4 +291,5 @@ class HistoryManager(metaclass=Singleton):
     
     def clear_selection(self):
         """Clear the node selection, fallback to current_node"""
-        self.selected_node = None
\ No newline at end of file
+        self.selected_node = None
+        self.selected_nodes = []
\ No newline at end of file
@@ -2,6 +2,17 @@ from PIL import Image, ImageTk
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional, List
+import itertools
+import numpy as np
+from ..colorSpace import guess_color_space, convert_color, to_display_rgb
+from ..renderUtils import DISPLAY_MAX_SIZE, render_fit
+
+def buffer_owner(array: np.ndarray) -> np.ndarray:
+    """The array owning the memory of a view, so shared buffers can be recognised"""
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
 
 # Data classes for node/nodelist as provided
 @dataclass
@@ -11,13 +22,162 @@ class ProcessingDetails:
     parameters: dict = None
 
 class ImageNode:
-    def __init__(self, input: any, output: any, operation_details: ProcessingDetails):
-        self.input = input
-        self.output = output
+    _id_counter = itertools.count(1)
+
+    def __init__(self, input: any, output: any, operation_details: ProcessingDetails, color_space: str = None):
+        self.node_id = next(ImageNode._id_counter)
+        self.buffer_store = None
+        self._input = input
+        self._output = output
+        # Buffer metadata, kept on the node so it is known without touching a compressed buffer
+        self.color_space = color_space or (guess_color_space(output) if output is not None else None)
+        self.dtype = output.dtype if output is not None else None
+        self.shape = output.shape if output is not None else None
+        self.reversible = False  # output converts back to the parent's color space without loss
+        self.pending = False  # output is being recomputed
+        self.version = 0  # bumped whenever the output is replaced, for caches derived from it
+        self.metrics: dict = {}
+        self._display_buffer = None
+        self._photos = {}
+        self.update_metrics()
         self.operation_details = operation_details
         self.previous_node: Optional[ImageNode] = None
         self.next_nodes: List[ImageNode] = []
 
+    @property
+    def input(self):
+        """Input buffer, falls back to the parent's output when not set explicitly"""
+        if self._input is None and self.previous_node is not None:
+            return self.previous_node.output
+        return self._input
+
+    @input.setter
+    def input(self, value):
+        self._input = value
+
+    @property
+    def output(self):
+        if self._output is not None or self.buffer_store is None:
+            return self._output
+        return self.buffer_store.get(self.node_id)
+
+    @property
+    def has_output(self) -> bool:
+        """True when the node holds an output, without decompressing it"""
+        return self._output is not None or (self.buffer_store is not None and self.node_id in self.buffer_store)
+
+    @output.setter
+    def output(self, value):
+        self._display_buffer = None
+        self.version += 1
+        if value is not None:
+            self.dtype = value.dtype
+            self.shape = value.shape
+        if self.buffer_store is not None:
+            self.buffer_store.discard(self.node_id)
+        if value is None or self.buffer_store is None or isinstance(value, np.memmap):
+            self._output = value
+        else:
+            self.buffer_store.put(self.node_id, value, on_evict=self.release_display_buffer)
+            self._output = None
+
+    def update_metrics(self, **values):
+        """Refresh the buffer metrics and merge in any extra values such as timings"""
+        self.metrics.update(values)
+        if self.shape is not None:
+            self.metrics["size"] = f"{self.shape[1]}x{self.shape[0]}"
+        if self.color_space is not None:
+            self.metrics["color"] = self.color_space
+        if self.dtype is not None:
+            self.metrics["dtype"] = str(self.dtype)
+
+    def attach_store(self, buffer_store):
+        """Move the output buffer into a compressed buffer store"""
+        if self.buffer_store is not None:
+            return
+        self.buffer_store = buffer_store
+        if self._output is None or isinstance(self._output, np.memmap):
+            return  # memory maps are already backed by the file and the OS page cache
+        buffer_store.put(self.node_id, self._output, on_evict=self.release_display_buffer)
+        self._output = None
+
+    def buffer_source(self, color_space: str) -> 'ImageNode':
+        """Node whose output is the closest to color_space, the node itself or an ancestor it only reordered"""
+        node = self
+        # Nodes that only reordered channels can hand over to their parent, walked iteratively for deep chains
+        while color_space != node.color_space and node.reversible and node.previous_node is not None:
+            node = node.previous_node
+        return node
+
+    def get_buffer(self, color_space: str):
+        """Get the output in the given color space, skipping no-op and inverse conversions"""
+        node = self.buffer_source(color_space)
+        if color_space == node.color_space:
+            return node.output
+        return convert_color(node.output, node.color_space, color_space)
+
+    def get_display_buffer(self, cache: bool = True):
+        """Get the output as an 8 bit RGB buffer of at most display size, kept on the node unless cache is False"""
+        display = self._display_buffer
+        if display is None:
+            output = self.output
+            if output is None:
+                return None
+            display = to_display_rgb(output, self.color_space, DISPLAY_MAX_SIZE)
+            if cache:
+                self._display_buffer = display
+        return display
+
+    def release_display_buffer(self):
+        self._display_buffer = None
+
+    def held_buffers(self) -> list:
+        """Arrays this node references in memory, without decompressing cold buffers"""
+        buffers = [self._output, self._input, self._display_buffer]
+        if self.buffer_store is not None:
+            buffers.append(self.buffer_store.peek(self.node_id))
+        return [buffer for buffer in buffers if buffer is not None]
+
+    def release_buffers(self, counted: Optional[set] = None) -> int:
+        """
+        Drop the output, input and every cached derivative of this node
+
+        Args:
+            counted: ids of buffer owners already counted or still held by other nodes, updated in place.
+                Buffers shared between nodes or with the display buffer are only counted once.
+
+        Returns:
+            int: bytes released, memory maps are not counted as they are backed by the file
+        """
+        counted = set() if counted is None else counted
+        released = 0
+        buffers = [self._output, self._input, self._display_buffer]
+        if self.buffer_store is not None:
+            hot, cold_bytes = self.buffer_store.remove(self.node_id)
+            buffers.append(hot)
+            released += cold_bytes
+        for buffer in buffers:
+            if buffer is None:
+                continue
+            owner = buffer_owner(buffer)
+            if isinstance(owner, np.memmap) or id(owner) in counted:
+                continue
+            counted.add(id(owner))
+            released += owner.nbytes
+        for photo in self._photos.values():
+            released += photo.width() * photo.height() * 4
+        self._output = None
+        self._input = None
+        self._display_buffer = None
+        self._photos.clear()
+        return released
+
+    def get_compression_info(self):
+        """Get the compressed storage details for this node's output, once it was compressed"""
+        if self.buffer_store is None:
+            return None
+        return self.buffer_store.compression_info(self.node_id)
+
     def __repr__(self):
         return f"ImageNode(operation={self.operation_details.operation_name}, timestamp={self.operation_details.timestamp})"
     
@@ -37,6 +197,20 @@ class ImageNode:
         node.previous_node = self
         self.next_nodes.append(node)
         
+    def detach(self):
+        """Unlink this node from its parent"""
+        if self.previous_node is not None:
+            self.previous_node.next_nodes.remove(self)
+            self.previous_node = None
+        
+    def walk(self):
+        """Iterate over this node and all its descendants, parents before children"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.next_nodes))
+
     def get_processing_chain(self) -> List[ProcessingDetails]:
         """Get the full chain of processing steps from start to this node"""
         chain = []
@@ -47,10 +221,23 @@ class ImageNode:
         return list(reversed(chain))
 
     def get_photo_preview(self, fw, fh):
-        i_pil_image = Image.fromarray(self.input) if self.input is not None else None
-        o_pil_image = Image.fromarray(self.output)
-        
-        output = ImageTk.PhotoImage(o_pil_image)
-        """Get the photo preview for the current node"""
-        input = ImageTk.PhotoImage(i_pil_image) if i_pil_image is not None else None
+        """Get input and output photos fitted to (fw, fh), reusing the previous photos when the size is unchanged"""
+        parent = self.previous_node
+        input_rgb = parent.get_display_buffer() if parent is not None else None
+        output_rgb = self.get_display_buffer()
+        input = self._fit_photo("input", input_rgb, fw, fh) if input_rgb is not None else None
+        output = self._fit_photo("output", output_rgb, fw, fh) if output_rgb is not None else None
         return input, output
+
+    def _fit_photo(self, role, rgb, fw, fh):
+        photos = self._photos
+        fitted = render_fit(rgb, fw, fh)
+        # PIL copies RGB data into its own 4 byte pixels, the fitted buffer is not kept alive by the frame
+        frame = Image.frombuffer("RGB", (fitted.shape[1], fitted.shape[0]), fitted, "raw", "RGB", 0, 1)
+        photo = photos.get(role)
+        if photo is not None and (photo.width(), photo.height()) == frame.size:
+            photo.paste(frame)
+        else:
+            photo = ImageTk.PhotoImage(frame)
+            photos[role] = photo
+        return photo
@@ -0,0 +1,384 @@
+import json
+import os
+import struct
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .colorSpace import GRAY, RGB, RGBA, guess_color_space
+from .renderUtils import display_buffer_bytes
+
+# TIFF tags needed to locate uncompressed pixel data
+_WIDTH, _HEIGHT, _BITS, _COMPRESSION, _PHOTOMETRIC = 256, 257, 258, 259, 262
+_STRIP_OFFSETS, _SAMPLES, _STRIP_COUNTS = 273, 277, 279
+_PLANAR, _TILE_WIDTH, _SAMPLE_FORMAT = 284, 322, 339
+_TYPE_FORMATS = {1: "B", 3: "H", 4: "I", 16: "Q"}
+
+# JPEG start of frame markers, the others in 0xC0..0xCF are DHT, JPG and DAC
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
+
+# Inputs above this many pixels, or compressing better than this ratio, are treated as decompression bombs
+MAX_PIXELS = 1 << 30
+MAX_COMPRESSION_RATIO = 1024
+_memory_budget: Optional[int] = None
+
+
+class ImageRefused(ValueError):
+    """Raised before decoding when an image can not be opened within the limits"""
+
+
+@dataclass
+class ImageHeader:
+    """Image properties read from the file header, without decoding pixels"""
+    format: str
+    width: int
+    height: int
+    channels: int
+    bit_depth: int
+    file_size: int
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    @property
+    def decoded_bytes(self) -> int:
+        return self.pixels * self.channels * max(1, self.bit_depth // 8)
+
+
+@dataclass
+class OpenPlan:
+    """How an image is opened and roughly how much memory that takes"""
+    strategy: str  # "full", "reduced", "mmap" or "decode" for formats the probe does not know
+    header: Optional[ImageHeader]
+    estimated_bytes: int
+    scale: int = 1  # reduced decodes keep 1/scale of each side
+
+    def describe(self) -> str:
+        if self.header is None:
+            return f"{self.strategy} (size known after decoding)"
+        size = f"{self.header.width}x{self.header.height}"
+        scale = f" 1/{self.scale}" if self.scale > 1 else ""
+        return f"{self.strategy}{scale} ({size}, ~{self.estimated_bytes / 2 ** 20:.1f} MiB)"
+
+
+def _read_tiff_tags(file, byte_order: str) -> dict:
+    """Read the tags of the first IFD of a classic TIFF file"""
+    file.seek(4)
+    ifd_offset = struct.unpack(byte_order + "I", file.read(4))[0]
+    file.seek(ifd_offset)
+    count = struct.unpack(byte_order + "H", file.read(2))[0]
+    entries = [struct.unpack(byte_order + "HHII", file.read(12)) for _ in range(count)]
+    tags = {}
+    for tag, value_type, value_count, value in entries:
+        fmt = _TYPE_FORMATS.get(value_type)
+        if fmt is None:
+            continue
+        size = struct.calcsize(fmt) * value_count
+        if size <= 4:
+            raw = struct.pack(byte_order + "I", value)[:size]
+        else:
+            file.seek(value)
+            raw = file.read(size)
+        tags[tag] = struct.unpack(byte_order + fmt * value_count, raw)
+    return tags
+
+
+def probe_uncompressed_tiff(path: str) -> Optional[dict]:
+    """
+    Describe the pixel layout of an uncompressed, chunky, single block TIFF
+
+    Returns:
+        dict with offset, shape, dtype and color_space, or None when the file
+        can not be memory mapped
+    """
+    with open(path, "rb") as file:
+        header = file.read(4)
+        if header[:2] == b"II":
+            byte_order = "<"
+        elif header[:2] == b"MM":
+            byte_order = ">"
+        else:
+            return None
+        if struct.unpack(byte_order + "H", header[2:4])[0] != 42:
+            return None  # BigTIFF or not a TIFF
+        tags = _read_tiff_tags(file, byte_order)
+
+    first = lambda tag, default=None: tags[tag][0] if tag in tags else default
+    if first(_COMPRESSION, 1) != 1 or first(_PLANAR, 1) != 1 or _TILE_WIDTH in tags:
+        return None
+    if _STRIP_OFFSETS not in tags or _STRIP_COUNTS not in tags:
+        return None
+    offsets, counts = tags[_STRIP_OFFSETS], tags[_STRIP_COUNTS]
+    # Strips must follow each other so the whole raster is one block in the file
+    for index in range(1, len(offsets)):
+        if offsets[index] != offsets[index - 1] + counts[index - 1]:
+            return None
+
+    width, height = first(_WIDTH), first(_HEIGHT)
+    samples = first(_SAMPLES, 1)
+    bits = first(_BITS, 8)
+    if bits not in (8, 16) or first(_SAMPLE_FORMAT, 1) != 1:
+        return None
+    photometric = first(_PHOTOMETRIC)
+    if photometric == 1 and samples == 1:
+        color_space = GRAY
+    elif photometric == 2 and samples in (3, 4):
+        color_space = RGB if samples == 3 else RGBA
+    else:
+        return None
+
+    dtype = np.dtype(np.uint8) if bits == 8 else np.dtype(byte_order + "u2")
+    shape = (height, width) if samples == 1 else (height, width, samples)
+    if sum(counts) < int(np.prod(shape)) * dtype.itemsize:
+        return None
+    return {"offset": offsets[0], "shape": shape, "dtype": dtype, "color_space": color_space}
+
+
+def _probe_raw(path: str) -> Optional[dict]:
+    """Read the JSON sidecar (<file>.json) describing a headerless raw raster"""
+    sidecar = path + ".json"
+    if not os.path.exists(sidecar):
+        return None
+    with open(sidecar) as file:
+        layout = json.load(file)
+    channels = layout.get("channels", 1)
+    shape = (layout["height"], layout["width"]) if channels == 1 else (layout["height"], layout["width"], channels)
+    return {
+        "offset": layout.get("offset", 0),
+        "shape": shape,
+        "dtype": np.dtype(layout.get("dtype", "uint8")),
+        "color_space": layout.get("color_space"),
+    }
+
+
+def map_image(path: str) -> Optional[Tuple[np.ndarray, str]]:
+    """
+    Expose an uncompressed raster as a read-only memory map
+
+    Pages are only read from disk when a region of the array is touched.
+
+    Returns:
+        tuple: (numpy.memmap, color space), or None if the file has no mappable layout
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        array = np.load(path, mmap_mode="r")
+        return array, guess_color_space(array)
+    if extension in (".tif", ".tiff"):
+        layout = probe_uncompressed_tiff(path)
+    elif extension == ".raw":
+        layout = _probe_raw(path)
+    else:
+        layout = None
+    if layout is None:
+        return None
+    array = np.memmap(path, dtype=layout["dtype"], mode="r", offset=layout["offset"], shape=layout["shape"])
+    return array, layout["color_space"] or guess_color_space(array)
+
+
+def _probe_png(file, file_size: int) -> Optional[ImageHeader]:
+    file.seek(8)
+    length, chunk = struct.unpack(">I4s", file.read(8))
+    if chunk != b"IHDR":
+        return None
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", file.read(10))
+    return ImageHeader("png", width, height, _PNG_CHANNELS.get(color_type, 4), bit_depth, file_size)
+
+
+def _probe_jpeg(file, file_size: int) -> Optional[ImageHeader]:
+    file.seek(2)
+    while True:
+        byte = file.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = file.read(1)
+        while marker == b"\xff":
+            marker = file.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0xD8 or 0xD0 <= code <= 0xD7 or code == 0x01:
+            continue  # markers without a payload
+        length = struct.unpack(">H", file.read(2))[0]
+        if code in _JPEG_SOF:
+            bit_depth, height, width, channels = struct.unpack(">BHHB", file.read(6))
+            return ImageHeader("jpeg", width, height, channels, bit_depth, file_size)
+        file.seek(length - 2, os.SEEK_CUR)
+
+
+def _probe_bmp(file, file_size: int) -> Optional[ImageHeader]:
+    file.seek(18)
+    width, height, _, bits = struct.unpack("<iiHH", file.read(12))
+    return ImageHeader("bmp", width, abs(height), 4 if bits == 32 else 3 if bits > 8 else 1, 8, file_size)
+
+
+def _probe_tiff(file, file_size: int, byte_order: str) -> Optional[ImageHeader]:
+    if struct.unpack(byte_order + "H", file.read(2))[0] != 42:
+        return None
+    tags = _read_tiff_tags(file, byte_order)
+    if _WIDTH not in tags or _HEIGHT not in tags:
+        return None
+    samples = tags.get(_SAMPLES, (1,))[0]
+    return ImageHeader("tiff", tags[_WIDTH][0], tags[_HEIGHT][0], samples, tags.get(_BITS, (8,))[0], file_size)
+
+
+def probe_header(path: str) -> Optional[ImageHeader]:
+    """
+    Read dimensions, channels and bit depth from the file header without decoding
+
+    Returns:
+        ImageHeader: None when the format is not one the probe reads, e.g. GIF, WebP or PPM
+
+    Raises:
+        ImageRefused: the file can not be read or the header of a known format is damaged
+    """
+    try:
+        file_size = os.path.getsize(path)
+    except OSError as e:
+        raise ImageRefused(f"Unable to read image: {path} ({e})") from e
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".raw":
+        layout = _probe_raw(path)
+        if layout is None:
+            raise ImageRefused(f"Raw image without a {path}.json layout sidecar: {path}")
+        shape = layout["shape"]
+        return ImageHeader("raw", shape[1], shape[0], shape[2] if len(shape) == 3 else 1,
+                           layout["dtype"].itemsize * 8, file_size)
+    try:
+        with open(path, "rb") as file:
+            magic = file.read(8)
+            header = None
+            if magic.startswith(b"\x93NUMPY"):
+                file.seek(0)
+                version = np.lib.format.read_magic(file)
+                read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+                shape, _, dtype = read_header(file)
+                if len(shape) in (2, 3):
+                    header = ImageHeader("npy", shape[1], shape[0], shape[2] if len(shape) == 3 else 1,
+                                         dtype.itemsize * 8, file_size)
+            elif magic == b"\x89PNG\r\n\x1a\n":
+                header = _probe_png(file, file_size)
+            elif magic.startswith(b"\xff\xd8"):
+                header = _probe_jpeg(file, file_size)
+            elif magic.startswith(b"BM"):
+                header = _probe_bmp(file, file_size)
+            elif magic[:2] in (b"II", b"MM"):
+                file.seek(2)
+                header = _probe_tiff(file, file_size, "<" if magic[:2] == b"II" else ">")
+    except (struct.error, ValueError, OSError) as e:
+        raise ImageRefused(f"Damaged image header: {path} ({e})") from e
+    if header is None:
+        return None
+    if header.width <= 0 or header.height <= 0:
+        raise ImageRefused(f"Invalid image size {header.width}x{header.height}: {path}")
+    return header
+
+
+def set_memory_budget(budget_bytes: Optional[int]):
+    """Memory a single decoded image may take, None uses a quarter of the physical memory"""
+    global _memory_budget
+    _memory_budget = budget_bytes
+
+
+def get_memory_budget() -> int:
+    if _memory_budget:
+        return _memory_budget
+    try:
+        physical = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        physical = 8 << 30
+    return physical // 4
+
+
+def plan_open(path: str, budget_bytes: Optional[int] = None) -> OpenPlan:
+    """
+    Choose how to open an image from its header and the memory budget
+
+    Uncompressed layouts are memory mapped, images fitting the budget are
+    decoded in full and JPEG files that do not fit are decoded at 1/2, 1/4
+    or 1/8 resolution by the codec itself. Anything else that does not fit
+    is refused, as are inputs with implausible pixel counts or compression
+    ratios. The display buffer kept on the root counts against the budget
+    too, for mapped images it is the only heap copy. Formats the probe does
+    not know are left to OpenCV, which applies its own pixel limit, and are
+    measured after decoding.
+
+    Raises:
+        ImageRefused: the image can not be opened within the limits
+    """
+    header = probe_header(path)
+    if header is None:
+        return OpenPlan("decode", None, 0)
+    budget = budget_bytes or get_memory_budget()
+    if header.pixels > MAX_PIXELS:
+        raise ImageRefused(f"{header.width}x{header.height} exceeds the {MAX_PIXELS} pixel limit: {path}")
+    display = display_buffer_bytes(header.width, header.height)
+    if header.format in ("npy", "raw") or (header.format == "tiff" and probe_uncompressed_tiff(path) is not None):
+        # Mapped pages are backed by the file, only the decimated display buffer lives on the heap
+        if display > budget:
+            raise ImageRefused(f"The display buffer needs ~{display / 2 ** 20:.0f} MiB, over the "
+                               f"{budget / 2 ** 20:.0f} MiB budget: {path}")
+        return OpenPlan("mmap", header, display)
+    if header.decoded_bytes > MAX_COMPRESSION_RATIO * max(header.file_size, 1):
+        raise ImageRefused(f"{header.width}x{header.height} from {header.file_size} bytes looks like a decompression bomb: {path}")
+
+    # OpenCV decodes to 8 bit, 3 channel BGR by default
+    decoded = header.pixels * 3 + display
+    if decoded <= budget:
+        return OpenPlan("full", header, decoded)
+    if header.format == "jpeg":
+        for scale in (2, 4, 8):
+            width, height = -(-header.width // scale), -(-header.height // scale)
+            reduced = width * height * 3 + display_buffer_bytes(width, height)
+            if reduced <= budget:
+                return OpenPlan("reduced", header, reduced, scale)
+    raise ImageRefused(f"{header.width}x{header.height} needs ~{decoded / 2 ** 20:.0f} MiB, over the "
+                       f"{budget / 2 ** 20:.0f} MiB budget; convert it to uncompressed TIFF or NPY to map it: {path}")
+
+
+_REDUCED_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def open_image(path: str, budget_bytes: Optional[int] = None) -> Tuple[np.ndarray, str, OpenPlan]:
+    """
+    Open an image following plan_open
+
+    Returns:
+        tuple: (image, color space, plan)
+    """
+    plan = plan_open(path, budget_bytes)
+    if plan.strategy == "mmap":
+        mapped = map_image(path)
+        if mapped is not None:
+            return mapped + (plan,)
+        raise ImageRefused(f"Unable to map image: {path}")
+    if plan.strategy == "reduced":
+        image = cv2.imread(path, _REDUCED_FLAGS[plan.scale])
+    else:
+        image = cv2.imread(path)
+    if image is None:
+        raise ImageRefused(f"Unsupported or damaged image: {path}")
+    if plan.strategy == "decode":
+        height, width = image.shape[:2]
+        channels = image.shape[2] if image.ndim == 3 else 1
+        header = ImageHeader(os.path.splitext(path)[1].lower().lstrip("."), width, height, channels,
+                             image.dtype.itemsize * 8, os.path.getsize(path))
+        plan = OpenPlan("full", header, image.nbytes + display_buffer_bytes(width, height))
+    return image, guess_color_space(image), plan
+
+
+def load_image(path: str) -> Tuple[np.ndarray, str]:
+    """
+    Load an image for the root node, memory mapping it when the layout allows
+
+    Returns:
+        tuple: (image, color space)
+    """
+    image, color_space, _ = open_image(path)
+    return image, color_space
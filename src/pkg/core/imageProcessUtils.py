@@ -1,13 +1,36 @@
 from pkg.utils.Singleton import Singleton
 from .history.HistoryManager import HistoryManager
-import cv2
+from .operations import get_operation
+from .livePreview import LivePreviewSession
+from .operationContext import BatchOperationJob, OperationCancelled, OperationContext, OperationJob
+from .scheduler import JobScheduler, Priority
+from .treeReplay import TreeReplayJob
+from .metrics import MetricsRegistry
+import time
+
+OPERATION_SECONDS = MetricsRegistry().histogram("i2c_operation_duration_seconds", "Time spent computing an operation", ("operation",))
+OPERATIONS_TOTAL = MetricsRegistry().counter("i2c_operations_total", "Operations run, by outcome", ("operation", "status"))
+
+
+def _record_operation(operation_name, elapsed, status = "ok"):
+    OPERATIONS_TOTAL.inc(1, operation_name, status)
+    if elapsed is not None:
+        OPERATION_SECONDS.observe(elapsed, operation_name)
+
 
 class ImageProcessor(metaclass=Singleton):
     def __init__(self, status_bar=None):
         # Initialize any required attributes
         self.history_manager = HistoryManager()
         self.status_bar = status_bar
-        pass
+        self.scheduler = JobScheduler()
+        MetricsRegistry().register_collector("scheduler", self._collect_scheduler_metrics)
+
+    def _collect_scheduler_metrics(self):
+        for name, depth in self.scheduler.queue_depths().items():
+            yield "i2c_scheduler_queued_jobs", "gauge", "Jobs waiting in the scheduler queue", {"priority": name}, depth
+        for name, stats in self.scheduler.stats().items():
+            yield "i2c_scheduler_running_jobs", "gauge", "Jobs running on scheduler workers", {"priority": name}, stats["running"]
 
     def update_status(self, message):
         """
@@ -19,6 +42,16 @@ class ImageProcessor(metaclass=Singleton):
         if self.status_bar:
             self.status_bar.update_status(message)
 
+    def update_progress(self, value):
+        """
+        Update status bar progress
+        
+        Args:
+            value: Progress between 0 and 1
+        """
+        if self.status_bar:
+            self.status_bar.update_progress(value)
+
     def load_image(self, file_path):
         """
         Load and resize image for display
@@ -33,7 +66,7 @@ class ImageProcessor(metaclass=Singleton):
         """
         # Read image using OpenCV
         self.history_manager.start_new_chain(file_path)
-        self.update_status(f"Loaded image: {file_path}")
+        self.update_status(f"Loaded image: {file_path} [{self.history_manager.open_plan.describe()}]")
         return self.history_manager.current_node.output
 
     def convertBGR2RGB(self, image = None):
@@ -44,18 +77,9 @@ class ImageProcessor(metaclass=Singleton):
             image: Input image in BGR format
             
         Returns:
-            tuple: (PIL PhotoImage, processed image)
+            processed image
         """
-        image = image if image is not None else self.history_manager.get_active_node().output
-
-        # Convert BGR to RGB
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        self.history_manager.add_processing_step(
-            output=image,
-            operation="RGB",
-            parameters=None
-        )
+        image = self.apply_operation("RGB", image=image)
         self.update_status(f"Converted image to RGB")
         return image
 
@@ -64,20 +88,213 @@ class ImageProcessor(metaclass=Singleton):
         Apply grayscale transformation to image
         
         Args:
-            input_file: Path to input image
+            image: Input image, active node output if not given
             
         Returns:
-            tuple: (output file path, operation parameters)
+            processed image
         """
-        image = image if image is not None else self.history_manager.get_active_node().output
+        image = self.apply_operation("Grayscale", image=image)
+        self.update_status(f"Converted image to Gray")
+        return image
 
-        # Read image using OpenCV
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    def apply_operation(self, operation_name, parameters = None, image = None):
+        """
+        Apply a registered operation to the active node and record it in history
         
-        self.history_manager.add_processing_step(
-            output=image,
-            operation="Grayscale"
+        Args:
+            operation_name: Name of the registered operation
+            parameters: Operation parameters, defaults are used for missing values
+            image: Input image in the active node's color space, active node output if not given
+            
+        Returns:
+            processed image
+        """
+        operation = get_operation(operation_name)
+        node = self.history_manager.get_active_node()
+        if image is None:
+            self.check_source(node)
+            image, color_space = operation.prepare_input(node)
+        else:
+            color_space = node.color_space
+        parameters = operation.resolve_parameters(parameters)
+        started = time.perf_counter()
+        output = operation.run(image, parameters, color_space=color_space)
+        elapsed = time.perf_counter() - started
+        _record_operation(operation_name, elapsed)
+        self.commit_operation(operation_name, output, parameters, metrics={"duration_ms": round(elapsed * 1000, 1)})
+        return output
+
+    def commit_operation(self, operation_name, output, parameters = None, parent_node = None, metrics = None):
+        """
+        Record an already computed operation output in history
+        
+        Args:
+            operation_name: Name of the operation
+            output: Computed output image
+            parameters: Parameters used to compute the output
+            parent_node: Node the output was computed from, active node if not given
+            metrics: Extra per node metrics, e.g. duration_ms
+        """
+        node = self._add_step(operation_name, output, parameters, parent_node, metrics)
+        self.update_status(f"Applied {operation_name}")
+        return node
+
+    def _add_step(self, operation_name, output, parameters, parent_node, metrics):
+        operation = get_operation(operation_name)
+        parent_node = parent_node or self.history_manager.get_active_node()
+        return self.history_manager.add_processing_step(
+            output=output,
+            operation=operation_name,
+            parameters=parameters or None,
+            parent_node=parent_node,
+            color_space=operation.output_space(parent_node.color_space, parameters),
+            reversible=operation.is_reversible(parent_node.color_space),
+            metrics=metrics
         )
 
-        self.update_status(f"Converted image to Gray")
-        return image
\ No newline at end of file
+    def start_live_preview(self, operation_name, on_preview, proxy_size = 1024):
+        """
+        Start a live parameter session on the active node
+        
+        Args:
+            operation_name: Name of the registered operation
+            on_preview: Called from a worker thread with (proxy output, parameters)
+            proxy_size: Longest side of the proxy image used while previewing
+            
+        Returns:
+            LivePreviewSession
+        """
+        source = self.history_manager.get_active_node()
+        self.check_source(source)
+        return LivePreviewSession(get_operation(operation_name), source, on_preview=on_preview, proxy_size=proxy_size)
+
+    def submit_operation(self, operation_name, parameters = None, on_progress = None):
+        """
+        Run a registered operation on the active node through the job scheduler
+        
+        The result is not added to history, call commit_operation with the
+        job result once it finished so a cancelled job leaves no node behind.
+        
+        Args:
+            operation_name: Name of the registered operation
+            parameters: Operation parameters, defaults are used for missing values
+            on_progress: Called from the worker thread with progress between 0 and 1
+            
+        Returns:
+            OperationJob: future resolves to the output image, or raises OperationCancelled
+            
+        Raises:
+            ValueError: the active node has no output yet, e.g. after a cancelled rebase
+        """
+        operation = get_operation(operation_name)
+        parent_node = self.history_manager.get_active_node()
+        self.check_source(parent_node)
+        parameters = operation.resolve_parameters(parameters)
+        job = OperationJob(operation_name, parameters, parent_node, OperationContext(on_progress=on_progress))
+        job.future = self.scheduler.submit(Priority.OPERATION, self._run_node_job, job, operation)
+        return job
+
+    def submit_operation_many(self, operation_name, parent_nodes, parameters = None, on_progress = None):
+        """
+        Run a registered operation on several nodes concurrently through the job scheduler
+        
+        Args:
+            operation_name: Name of the registered operation
+            parent_nodes: Nodes the operation is applied to
+            parameters: Operation parameters, defaults are used for missing values
+            on_progress: Called from worker threads with the mean progress between 0 and 1
+            
+        Returns:
+            BatchOperationJob: future resolves to the per node jobs, commit them with commit_operations
+            
+        Raises:
+            ValueError: one of the nodes has no output yet
+        """
+        operation = get_operation(operation_name)
+        for parent_node in parent_nodes:
+            self.check_source(parent_node)
+        parameters = operation.resolve_parameters(parameters)
+        batch = BatchOperationJob(operation_name, parameters, parent_nodes, on_progress=on_progress)
+        if not batch.jobs:
+            batch.future.set_result([])
+        for job in batch.jobs:
+            job.future = self.scheduler.submit(Priority.OPERATION, self._run_node_job, job, operation)
+            batch.track(job)
+        return batch
+
+    @staticmethod
+    def check_source(node):
+        """Raise ValueError when a node has no output an operation could start from"""
+        if node is None:
+            raise ValueError("No image loaded")
+        label = f"{node.operation_details.operation_name} #{node.node_id}"
+        if node.pending:
+            raise ValueError(f"{label} is still being recomputed, wait for the rebase to finish")
+        if not node.has_output:
+            raise ValueError(f"{label} has no output, rebase again or pick another node")
+
+    @classmethod
+    def _run_node_job(cls, job, operation):
+        # Inputs are prepared on the worker, reading a spilled buffer never blocks the Tk thread
+        job.context.check()
+        image, color_space = operation.prepare_input(job.parent_node)
+        return cls._run_job(job, operation, image, color_space)
+
+    def commit_operations(self, jobs):
+        """
+        Record the finished jobs of a batch in history in one step, cancelled and failed jobs are skipped
+        
+        Returns:
+            tuple: (new nodes, {job: error} for jobs that did not produce an output)
+        """
+        nodes, errors = [], {}
+        for job in jobs:
+            try:
+                output = job.future.result()
+            except Exception as e:
+                errors[job] = e
+                continue
+            metrics = {"duration_ms": round(job.elapsed * 1000, 1)} if job.elapsed is not None else None
+            nodes.append(self._add_step(job.operation_name, output, job.parameters, job.parent_node, metrics))
+        if nodes:
+            # Every new node becomes the selection, the first one is shown
+            self.history_manager.set_selected_nodes(nodes)
+        self.update_status(f"Applied {jobs[0].operation_name} to {len(nodes)} nodes" if jobs else "Nothing to apply")
+        return nodes, errors
+
+    @staticmethod
+    def _run_job(job, operation, image, color_space):
+        started = time.perf_counter()
+        try:
+            output = operation.run(image, job.parameters, job.context, color_space)
+        except OperationCancelled:
+            _record_operation(job.operation_name, None, "cancelled")
+            raise
+        except Exception:
+            _record_operation(job.operation_name, None, "failed")
+            raise
+        job.elapsed = time.perf_counter() - started
+        _record_operation(job.operation_name, job.elapsed)
+        return output
+
+    def rebase_tree(self, input_file, on_node_done = None):
+        """
+        Run the current history tree on a new source image
+        
+        Args:
+            input_file: Path of the new source image
+            on_node_done: Called from a worker thread with (node, error) as each node finishes
+            
+        Returns:
+            TreeReplayJob: future resolves once every node was recomputed or skipped
+        """
+        root = self.history_manager.rebase_root(input_file)
+        self.update_status(f"Rebasing history onto: {input_file}")
+
+        def node_done(node, error):
+            node.update_metrics()
+            self.history_manager.index.update(node)
+            if on_node_done:
+                on_node_done(node, error)
+
+        return TreeReplayJob(root, self.scheduler, on_node_done=node_done).start()
@@ -0,0 +1,81 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from .operations import Operation, make_proxy
+from .scheduler import JobScheduler, Priority
+
+logger = logging.getLogger(__name__)
+
+
+class LivePreviewSession:
+    """
+    Runs a parameterized operation while its parameters are being changed.
+
+    Previews run on a downscaled proxy of the source image. Only the latest
+    requested parameters are computed, and results that became stale while
+    computing are dropped. Commit runs once at full resolution.
+    """
+    def __init__(self, operation: Operation, source_node, on_preview: Callable = None, proxy_size: int = 1024):
+        self.operation = operation
+        self.source_node = source_node
+        self.source, self.source_space = operation.prepare_input(source_node)
+        self.output_space = operation.output_space(self.source_space)
+        self.on_preview = on_preview
+        self.proxy, self.proxy_scale = make_proxy(self.source, proxy_size)
+        self.scheduler = JobScheduler()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._pending: Optional[tuple] = None
+        self._running = False
+
+    def preview(self, parameters: dict):
+        """Request a proxy preview, replacing any request not yet started"""
+        with self._lock:
+            self._generation += 1
+            self._pending = (self._generation, parameters)
+            if self._running:
+                return
+            self._running = True
+        self.scheduler.submit(Priority.INTERACTIVE, self._drain)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if self._pending is None:
+                    self._running = False
+                    return
+                generation, parameters = self._pending
+                self._pending = None
+            # A failing request is logged and skipped, the loop must keep going to reset _running
+            try:
+                resolved = self.operation.resolve_parameters(parameters)
+                output = self.operation.run(self.proxy, self.operation.scale_parameters(resolved, self.proxy_scale),
+                                            color_space=self.source_space)
+                with self._lock:
+                    stale = generation != self._generation
+                if not stale and self.on_preview:
+                    self.on_preview(output, resolved)
+            except Exception:
+                logger.exception("Live preview of %s failed with %s", self.operation.name, parameters)
+
+    def commit(self, parameters: dict) -> Future:
+        """
+        Run the operation once at full resolution
+
+        Returns:
+            Future: resolves to (output, resolved parameters)
+        """
+        with self._lock:
+            # Invalidate any proxy preview still in flight
+            self._generation += 1
+            self._pending = None
+        resolved = self.operation.resolve_parameters(parameters)
+        return self.scheduler.submit(
+            Priority.OPERATION, lambda: (self.operation.run(self.source, resolved, color_space=self.source_space), resolved))
+
+    def close(self):
+        with self._lock:
+            self._generation += 1
+            self._pending = None
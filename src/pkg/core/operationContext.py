@@ -0,0 +1,147 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+import numpy as np
+
+
+class OperationCancelled(Exception):
+    """Raised inside an operation when its cancellation token was triggered"""
+
+
+class CancellationToken:
+    """Thread safe flag used to ask a running operation to stop"""
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled()
+
+
+class OperationContext:
+    """Cancellation and progress reporting handed to a running operation"""
+    def __init__(self, token: Optional[CancellationToken] = None, on_progress: Optional[Callable[[float], None]] = None):
+        self.token = token or CancellationToken()
+        self.on_progress = on_progress
+
+    def check(self):
+        self.token.raise_if_cancelled()
+
+    def report(self, done: int, total: int):
+        """Report progress and stop here if the operation was cancelled"""
+        if self.on_progress:
+            self.on_progress(done / max(total, 1))
+        self.check()
+
+
+class OperationJob:
+    """An operation submitted to a background executor"""
+    def __init__(self, operation_name: str, parameters: dict, parent_node, context: OperationContext):
+        self.operation_name = operation_name
+        self.parameters = parameters
+        self.parent_node = parent_node
+        self.context = context
+        self.future = None
+        self.elapsed = None  # seconds spent computing, set once finished
+
+    def cancel(self):
+        self.context.token.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.context.token.cancelled
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+
+class BatchOperationJob:
+    """
+    One operation fanned out over several parent nodes.
+
+    Every per node job shares a single cancellation token, progress is the
+    mean over the jobs and `future` resolves with the list of jobs once all
+    of them finished, cancelled or failed.
+    """
+    def __init__(self, operation_name: str, parameters: dict, parent_nodes, on_progress: Optional[Callable[[float], None]] = None):
+        self.operation_name = operation_name
+        self.parameters = parameters
+        self.token = CancellationToken()
+        self.on_progress = on_progress
+        self.jobs = [
+            OperationJob(operation_name, parameters, parent, OperationContext(self.token, self._progress_callback(index)))
+            for index, parent in enumerate(parent_nodes)
+        ]
+        self.future = Future()
+        self._progress = [0.0] * len(self.jobs)
+        self._remaining = len(self.jobs)
+        self._lock = threading.Lock()
+
+    def _progress_callback(self, index: int):
+        def report(value: float):
+            self._progress[index] = value
+            if self.on_progress:
+                self.on_progress(sum(self._progress) / len(self._progress))
+        return report
+
+    def track(self, job: OperationJob):
+        """Count a submitted job towards the batch future"""
+        job.future.add_done_callback(self._job_done)
+
+    def _job_done(self, future):
+        with self._lock:
+            self._remaining -= 1
+            finished = self._remaining == 0
+        if finished:
+            self.future.set_result(self.jobs)
+
+    def cancel(self):
+        self.token.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.token.cancelled
+
+    def done(self) -> bool:
+        return self.future.done()
+
+
+def run_in_strips(function: Callable, image, context: OperationContext, parameters: dict = None,
+                  halo: int = 0, strip_height: int = 256):
+    """
+    Run a row independent operation strip by strip, reporting progress per strip
+
+    Args:
+        function: Operation function taking (image, **parameters)
+        image: Input image
+        context: Cancellation and progress context
+        parameters: Operation parameters
+        halo: Extra rows each strip needs above and below, e.g. a filter radius
+        strip_height: Rows computed per strip
+
+    Returns:
+        processed image
+    """
+    parameters = parameters or {}
+    height = image.shape[0]
+    total = max(1, -(-height // strip_height))
+    output = None
+    context.check()
+    for index, y0 in enumerate(range(0, height, strip_height)):
+        y1 = min(y0 + strip_height, height)
+        top = max(0, y0 - halo)
+        bottom = min(height, y1 + halo)
+        strip = function(image[top:bottom], **parameters)
+        if output is None:
+            output = np.empty((height,) + strip.shape[1:], dtype=strip.dtype)
+        output[y0:y1] = strip[y0 - top:y0 - top + (y1 - y0)]
+        context.report(index + 1, total)
+    return output
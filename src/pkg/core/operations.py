@@ -0,0 +1,194 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import cv2
+
+from .operationContext import OperationContext, run_in_strips
+from .colorSpace import BGR, RGB, GRAY, REVERSIBLE, convert_color, guess_color_space
+
+
+@dataclass
+class ParameterSpec:
+    """Describes a single tunable parameter of an operation"""
+    name: str
+    minimum: float
+    maximum: float
+    default: float
+    step: float = 1
+    spatial: bool = False  # value is measured in pixels and scales with the image
+
+    def clamp(self, value: float) -> float:
+        value = min(max(value, self.minimum), self.maximum)
+        if self.step >= 1:
+            value = int(round(value / self.step) * self.step)
+        return value
+
+
+@dataclass
+class Operation:
+    """
+    An image operation that can be replayed from its name and parameters.
+
+    The input is converted to `requires` before `function` runs, an operation
+    without a function is a pure color space conversion. The output is in
+    `produces`, or in the (converted) input space when not set.
+    """
+    name: str
+    function: Optional[Callable]
+    parameters: List[ParameterSpec] = field(default_factory=list)
+    halo: Optional[Callable[[dict], int]] = None  # rows of context needed around a strip
+    requires: Optional[str] = None
+    produces: Optional[str] = None
+
+    def default_parameters(self) -> dict:
+        return {spec.name: spec.default for spec in self.parameters}
+
+    def resolve_parameters(self, parameters: Optional[dict] = None) -> dict:
+        """Merge given parameters with the defaults and clamp them to their ranges"""
+        resolved = self.default_parameters()
+        resolved.update(parameters or {})
+        for spec in self.parameters:
+            resolved[spec.name] = spec.clamp(resolved[spec.name])
+        return resolved
+
+    def scale_parameters(self, parameters: dict, scale: float) -> dict:
+        """Scale spatial parameters for running on a resized image"""
+        scaled = dict(parameters)
+        for spec in self.parameters:
+            if spec.spatial:
+                scaled[spec.name] = max(spec.minimum, parameters[spec.name] * scale)
+        return scaled
+
+    def output_space(self, input_space: str, parameters: Optional[dict] = None) -> str:
+        return self.produces or self.requires or input_space
+
+    def is_reversible(self, input_space: str) -> bool:
+        """True when the output can be turned back into the input without loss"""
+        output_space = self.output_space(input_space)
+        return self.function is None and (input_space == output_space or (input_space, output_space) in REVERSIBLE)
+
+    def prepare_input(self, node):
+        """
+        Get the node buffer this operation starts from, in the color space it consumes when no conversion is needed
+
+        Conversions are left to run, so they happen strip by strip with progress and cancellation.
+
+        Returns:
+            tuple: (image, color space)
+        """
+        if self.requires:
+            source = node.buffer_source(self.requires)
+            if source.color_space == self.requires:
+                return source.output, self.requires
+        return node.output, node.color_space
+
+    def apply(self, image, parameters: Optional[dict] = None, color_space: Optional[str] = None):
+        return self.run(image, parameters, color_space=color_space)
+
+    def run(self, image, parameters: Optional[dict] = None, context: Optional[OperationContext] = None,
+            color_space: Optional[str] = None):
+        """Apply the operation, in strips when a context is given so it can report progress and be cancelled"""
+        parameters = self.resolve_parameters(parameters)
+        source_space = color_space or guess_color_space(image)
+        target_space = self.requires or source_space
+        if self.function is None:
+            if source_space == target_space:
+                # Already in the target space, nothing to compute
+                return image
+            function = lambda strip: convert_color(strip, source_space, target_space)
+        elif source_space != target_space:
+            function = lambda strip, **values: self.function(convert_color(strip, source_space, target_space), **values)
+        else:
+            function = self.function
+        if context is None:
+            return function(image, **parameters)
+        halo = self.halo(parameters) if self.halo else 0
+        return run_in_strips(function, image, context, parameters, halo=halo)
+
+
+@dataclass
+class ChainOperation(Operation):
+    """
+    Several steps collapsed into one history node, replayed one after another.
+
+    The steps are kept in the `steps` parameter as recipe entries, so a
+    collapsed node can still be replayed and saved as a recipe.
+    """
+    def output_space(self, input_space: str, parameters: Optional[dict] = None) -> str:
+        for step in (parameters or {}).get("steps", []):
+            operation = get_operation(step["operation"])
+            input_space = operation.output_space(input_space, step.get("parameters"))
+        return input_space
+
+    def is_reversible(self, input_space: str) -> bool:
+        return False
+
+    def run(self, image, parameters: Optional[dict] = None, context: Optional[OperationContext] = None,
+            color_space: Optional[str] = None):
+        color_space = color_space or guess_color_space(image)
+        for step in (parameters or {}).get("steps", []):
+            operation = get_operation(step["operation"])
+            image = operation.run(image, step.get("parameters"), context, color_space)
+            color_space = operation.output_space(color_space, step.get("parameters"))
+        return image
+
+
+def threshold(image, threshold=127):
+    _, output = cv2.threshold(image, threshold, 255, cv2.THRESH_BINARY)
+    return output
+
+
+def gaussian_blur(image, radius=3):
+    kernel = int(radius) * 2 + 1
+    return cv2.GaussianBlur(image, (kernel, kernel), 0)
+
+
+def pencil_sketch(image, strength=21):
+    """Colour dodge of the grayscale image with its blurred negative"""
+    kernel = int(strength) * 2 + 1
+    blurred = cv2.GaussianBlur(255 - image, (kernel, kernel), 0)
+    return cv2.divide(image, 255 - blurred, scale=256)
+
+
+OPERATIONS: Dict[str, Operation] = {}
+
+
+def register_operation(operation: Operation):
+    OPERATIONS[operation.name] = operation
+    return operation
+
+
+def get_operation(name: str) -> Operation:
+    if name not in OPERATIONS:
+        raise ValueError(f"Unknown operation: {name}")
+    return OPERATIONS[name]
+
+
+register_operation(Operation("RGB", None, requires=RGB))
+register_operation(Operation("BGR", None, requires=BGR))
+register_operation(Operation("Grayscale", None, requires=GRAY))
+register_operation(Operation("Threshold", threshold, [
+    ParameterSpec("threshold", 0, 255, 127),
+], requires=GRAY))
+register_operation(Operation("Blur", gaussian_blur, [
+    ParameterSpec("radius", 0, 50, 3, spatial=True),
+], halo=lambda parameters: int(parameters["radius"])))
+register_operation(Operation("Sketch", pencil_sketch, [
+    ParameterSpec("strength", 1, 60, 21, spatial=True),
+], halo=lambda parameters: int(parameters["strength"]), requires=GRAY))
+register_operation(ChainOperation("Chain", None))
+
+
+def make_proxy(image, max_size: int):
+    """
+    Downscale an image so its longest side is at most max_size
+
+    Returns:
+        tuple: (proxy image, scale factor applied)
+    """
+    h, w = image.shape[:2]
+    scale = min(1.0, max_size / max(h, w))
+    if scale >= 1.0:
+        return image, 1.0
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
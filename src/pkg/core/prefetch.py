@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .metrics import MetricsRegistry
+from .renderUtils import render_fit
+from .scheduler import JobScheduler, Priority
+
+PREFETCH_TOTAL = MetricsRegistry().counter("i2c_preview_prefetch_total",
+                                           "Preview prefetch renders and cache lookups, by outcome", ("outcome",))
+
+
+class PrefetchCache:
+    """LRU of fitted preview buffers per node version and container size"""
+    def __init__(self, capacity: int = 12):
+        self.capacity = capacity
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(node, size: Tuple[int, int]) -> tuple:
+        return (node.node_id, node.version, int(size[0]), int(size[1]))
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._buffers
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._buffers)
+
+    def put(self, key, buffer: np.ndarray):
+        with self._lock:
+            self._buffers[key] = buffer
+            self._buffers.move_to_end(key)
+            while len(self._buffers) > self.capacity:
+                self._buffers.popitem(last=False)
+
+    def take(self, key) -> Optional[np.ndarray]:
+        """Remove and return a buffer, the caller owns it afterwards"""
+        with self._lock:
+            return self._buffers.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+
+
+class PreviewPrefetcher:
+    """
+    Renders the previews of the nodes likely to be selected next while the app is idle.
+
+    Around a selected node the siblings, first child and parent are the
+    items arrow key navigation reaches next. For each of them the output and
+    its parent's output (the input preview) are fitted to the current preview
+    sizes on the idle scheduler class. A new selection cancels everything
+    still queued from the previous one, and finished buffers wait in a small
+    LRU until the preview takes them.
+    """
+    def __init__(self, scheduler: Optional[JobScheduler] = None, capacity: int = 12, max_nodes: int = 6):
+        self.scheduler = scheduler or JobScheduler()
+        self.cache = PrefetchCache(capacity)
+        self.max_nodes = max_nodes
+        self._generation = 0
+        self._pending: List[Future] = []
+        MetricsRegistry().register_collector("prefetch", self._collect_metrics)
+
+    def _collect_metrics(self):
+        yield "i2c_preview_prefetch_cached", "gauge", "Fitted preview buffers waiting in the prefetch cache", {}, len(self.cache)
+
+    def neighbours(self, node) -> list:
+        """Nodes in the order navigation is likely to reach them"""
+        candidates = []
+        parent = node.previous_node
+        if parent is not None:
+            siblings = parent.next_nodes
+            index = next((i for i, sibling in enumerate(siblings) if sibling is node), 0)
+            candidates.extend(siblings[index + 1:index + 2])
+            candidates.extend(siblings[max(0, index - 1):index])
+        candidates.extend(node.next_nodes[:1])
+        if parent is not None:
+            candidates.append(parent)
+            candidates.extend(parent.next_nodes)
+        candidates.extend(node.next_nodes[1:])
+        result = []
+        for candidate in candidates:
+            if candidate is not node and all(candidate is not seen for seen in result):
+                result.append(candidate)
+        return result[:self.max_nodes]
+
+    def prefetch(self, node, sizes: dict):
+        """
+        Queue the previews around a node, cancelling the ones queued for an earlier selection
+
+        Args:
+            node: Newly selected node
+            sizes: {"input": (w, h), "output": (w, h)} preview container sizes
+        """
+        self.cancel()
+        generation = self._generation
+        targets = []
+        for neighbour in self.neighbours(node):
+            targets.append((neighbour, sizes["output"]))
+            if neighbour.previous_node is not None:
+                targets.append((neighbour.previous_node, sizes["input"]))
+        queued = set()
+        for source, size in targets:
+            key = self.cache.key(source, size)
+            if key in queued or key in self.cache:
+                continue
+            queued.add(key)
+            self._pending.append(self.scheduler.submit(Priority.IDLE, self._render, generation, source, key))
+
+    def _render(self, generation: int, source, key: tuple):
+        # Selection moved on while this job waited, its buffer would not be used
+        if generation != self._generation:
+            PREFETCH_TOTAL.inc(1, "cancelled")
+            return
+        # Converted without keeping it on the node, only the fitted buffer is cached
+        rgb = source.get_display_buffer(cache=False)
+        if rgb is None or generation != self._generation:
+            return
+        self.cache.put(key, render_fit(rgb, key[2], key[3]))
+        PREFETCH_TOTAL.inc(1, "rendered")
+
+    def take(self, node, size) -> Optional[np.ndarray]:
+        """Fitted buffer of a node's output for a container size, None when it was not prefetched"""
+        buffer = self.cache.take(self.cache.key(node, size))
+        PREFETCH_TOTAL.inc(1, "hit" if buffer is not None else "miss")
+        return buffer
+
+    def cancel(self):
+        """Drop queued prefetches, running ones stop before fitting their buffer"""
+        self._generation += 1
+        for future in self._pending:
+            future.cancel()
+        self._pending = []
@@ -0,0 +1,42 @@
+import json
+from typing import List, Optional
+
+from .operationContext import OperationContext
+from .operations import get_operation
+
+
+def recipe_from_chain(chain) -> List[dict]:
+    """Turn a processing chain (list of ProcessingDetails) into replayable steps"""
+    return [
+        {"operation": details.operation_name, "parameters": details.parameters or {}}
+        for details in chain
+        if details.operation_name != "Original"
+    ]
+
+
+def save_recipe(path: str, chain):
+    with open(path, "w") as file:
+        json.dump({"steps": recipe_from_chain(chain)}, file, indent=2)
+
+
+def load_recipe(path: str) -> List[dict]:
+    """Load recipe steps, validating that every operation is known"""
+    with open(path) as file:
+        steps = json.load(file)["steps"]
+    for step in steps:
+        get_operation(step["operation"])
+    return steps
+
+
+def apply_recipe(image, color_space: str, steps: List[dict], context: Optional[OperationContext] = None):
+    """
+    Run recipe steps one after another
+
+    Returns:
+        tuple: (output image, output color space)
+    """
+    for step in steps:
+        operation = get_operation(step["operation"])
+        image = operation.run(image, step.get("parameters"), context, color_space)
+        color_space = operation.output_space(color_space, step.get("parameters"))
+    return image, color_space
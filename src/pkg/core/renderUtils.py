@@ -0,0 +1,43 @@
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Longest side of the display buffers kept on nodes, previews and comparisons never need more
+DISPLAY_MAX_SIZE = 2048
+
+
+def display_buffer_bytes(width: int, height: int) -> int:
+    """Bytes of the RGB display buffer kept for an image of this size"""
+    scale = min(1.0, DISPLAY_MAX_SIZE / max(width, height, 1))
+    return max(1, int(width * scale)) * max(1, int(height * scale)) * 3
+
+
+def fit_size(width: int, height: int, container_w: int, container_h: int) -> Tuple[int, int]:
+    """Largest size with the image aspect ratio that fits the container"""
+    scale = min(container_w / width, container_h / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def render_fit(rgb, container_w: int, container_h: int, dst: Optional[np.ndarray] = None):
+    """
+    Resize a display buffer to fit a container, keeping the aspect ratio
+
+    Args:
+        rgb: Display ready RGB buffer
+        container_w: Container width
+        container_h: Container height
+        dst: Optional buffer of the fitted size to resize into, reused when it matches
+
+    Returns:
+        resized contiguous RGB buffer
+    """
+    h, w = rgb.shape[:2]
+    new_w, new_h = fit_size(w, h, container_w, container_h)
+    if dst is None or dst.shape[:2] != (new_h, new_w):
+        dst = np.empty((new_h, new_w) + rgb.shape[2:], dtype=rgb.dtype)
+    if (new_w, new_h) == (w, h):
+        np.copyto(dst, rgb)
+        return dst
+    interpolation = cv2.INTER_AREA if new_w < w else cv2.INTER_LINEAR
+    return cv2.resize(rgb, (new_w, new_h), dst=dst, interpolation=interpolation)
@@ -0,0 +1,201 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from enum import IntEnum
+from typing import Dict, Optional
+
+import cv2
+
+from pkg.utils.Singleton import Singleton
+
+
+class Priority(IntEnum):
+    """Job classes, lower value runs first"""
+    INTERACTIVE = 0  # preview rendering the user is waiting on
+    OPERATION = 1    # operations triggered from the menu
+    BACKGROUND = 2   # thumbnails, statistics
+    BATCH = 3        # exports, batch replays
+    IDLE = 4         # speculative work such as preview prefetch, only starts when the pool is otherwise empty
+
+
+# Classes that together may not use more than the shared limit, the remaining workers stay free for interactive work
+SHARED_CLASSES = (Priority.BACKGROUND, Priority.BATCH, Priority.IDLE)
+
+
+class _Job:
+    __slots__ = ("priority", "function", "args", "kwargs", "future", "submitted")
+
+    def __init__(self, priority, function, args, kwargs):
+        self.priority = priority
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class JobScheduler(metaclass=Singleton):
+    """
+    Central priority scheduler for all background work.
+
+    Jobs wait in a single priority queue and run on a shared pool of worker
+    threads. Background, batch and idle classes share a cap below the pool
+    size, so long exports never occupy every worker and interactive work can
+    always start right away.
+    """
+    def __init__(self):
+        self.workers = os.cpu_count() or 2
+        self.limits: Dict[Priority, int] = {}
+        self.shared_limit = 1
+        self._queue = []
+        self._sequence = itertools.count()
+        self._running = {priority: 0 for priority in Priority}
+        self._wait_times = {priority: deque(maxlen=1024) for priority in Priority}
+        self._run_times = {priority: deque(maxlen=1024) for priority in Priority}
+        self._threads = []
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self.configure()
+
+    def configure(self, workers: Optional[int] = None, cv_threads: Optional[int] = None, batch_workers: Optional[int] = None):
+        """
+        Configure pool size and OpenCV threading
+
+        Args:
+            workers: Number of scheduler worker threads, defaults to the CPU count
+            cv_threads: Threads OpenCV may use inside a single call, defaults to the CPU count
+            batch_workers: Workers background, batch and idle jobs may occupy together, defaults to workers - 1
+        """
+        cpus = os.cpu_count() or 2
+        with self._condition:
+            self.workers = max(1, workers or cpus)
+            batch_workers = max(1, min(batch_workers or self.workers - 1, self.workers))
+            self.shared_limit = batch_workers
+            self.limits = {
+                Priority.INTERACTIVE: self.workers,
+                Priority.OPERATION: self.workers,
+                Priority.BACKGROUND: batch_workers,
+                Priority.BATCH: batch_workers,
+                Priority.IDLE: 1,
+            }
+            self._condition.notify_all()
+        # The OpenCV setting is process wide. Its pool serves one parallel call at a time and runs calls made
+        # meanwhile on the calling thread, so a single interactive operation gets every core without
+        # oversubscribing them when several jobs run side by side
+        cv2.setNumThreads(cv_threads if cv_threads is not None else cpus)
+
+    def submit(self, priority: Priority, function, *args, **kwargs) -> Future:
+        """Queue function(*args, **kwargs) in a priority class"""
+        job = _Job(Priority(priority), function, args, kwargs)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+            heapq.heappush(self._queue, (job.priority, next(self._sequence), job))
+            self._ensure_workers()
+            self._condition.notify()
+        return job.future
+
+    def _ensure_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"scheduler-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _busy(self) -> bool:
+        return any(count for priority, count in self._running.items() if priority != Priority.IDLE)
+
+    def _shared_running(self) -> int:
+        return sum(count for priority, count in self._running.items() if priority in SHARED_CLASSES)
+
+    def _next_job(self) -> Optional[_Job]:
+        """Pop the highest priority job whose class is below its own limit and the shared limit"""
+        deferred = []
+        job = None
+        shared_running = self._shared_running()
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            candidate = entry[2]
+            below_limit = self._running[candidate.priority] < self.limits[candidate.priority]
+            if candidate.priority == Priority.IDLE and (deferred or self._busy()):
+                # Idle work can't be preempted, it only starts when no other job is queued or running
+                below_limit = False
+            if below_limit and (candidate.priority not in SHARED_CLASSES or shared_running < self.shared_limit):
+                job = candidate
+                break
+            deferred.append(entry)
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+        return job
+
+    def _worker(self):
+        current = threading.current_thread()
+        while True:
+            with self._condition:
+                job = None
+                while job is None:
+                    if self._shutdown or len(self._threads) > self.workers:
+                        if current in self._threads:
+                            self._threads.remove(current)
+                        return
+                    job = self._next_job()
+                    if job is None:
+                        self._condition.wait()
+                self._running[job.priority] += 1
+
+            started = time.perf_counter()
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        job.future.set_result(job.function(*job.args, **job.kwargs))
+                    except BaseException as e:
+                        job.future.set_exception(e)
+            finally:
+                finished = time.perf_counter()
+                with self._condition:
+                    self._running[job.priority] -= 1
+                    self._wait_times[job.priority].append(started - job.submitted)
+                    self._run_times[job.priority].append(finished - started)
+                    self._condition.notify_all()
+
+    def queue_depths(self) -> Dict[str, int]:
+        with self._condition:
+            depths = {priority.name: 0 for priority in Priority}
+            for _, _, job in self._queue:
+                depths[job.priority.name] += 1
+            return depths
+
+    @staticmethod
+    def _percentiles(samples) -> dict:
+        if not samples:
+            return {"p50": None, "p90": None, "p99": None}
+        ordered = sorted(samples)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return {"p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99)}
+
+    def stats(self) -> dict:
+        """Queue depth, running jobs and wait/run latency percentiles (seconds) per class"""
+        depths = self.queue_depths()
+        with self._condition:
+            return {
+                priority.name: {
+                    "queued": depths[priority.name],
+                    "running": self._running[priority],
+                    "limit": self.limits[priority],
+                    "wait": self._percentiles(list(self._wait_times[priority])),
+                    "run": self._percentiles(list(self._run_times[priority])),
+                }
+                for priority in Priority
+            }
+
+    def shutdown(self):
+        with self._condition:
+            self._shutdown = True
+            for _, _, job in self._queue:
+                job.future.cancel()
+            self._queue.clear()
+            self._condition.notify_all()
@@ -0,0 +1,55 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Iterator
+
+SESSION_LOG_VERSION = 1
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SessionRecorder:
+    """
+    Appends user actions of a GUI session to a JSON lines file.
+
+    Every line holds the event name, seconds since the session started and
+    the event fields. Nodes are referred to by node_id, which a replay maps
+    to the nodes it recreates.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+        self.record("session", version=SESSION_LOG_VERSION, started=datetime.now().isoformat())
+
+    def record(self, event: str, **fields):
+        entry = {"event": event, "t": round(time.perf_counter() - self._started, 4), **fields}
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_session(path: str) -> Iterator[dict]:
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
@@ -0,0 +1,94 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from .operationContext import CancellationToken, OperationCancelled
+from .operations import get_operation
+from .scheduler import JobScheduler, Priority
+
+
+class TreeReplayJob:
+    """
+    Re-executes every node below a root from its recorded operation and parameters.
+
+    A node is submitted as soon as its parent output is ready, so a shared
+    prefix runs once and independent branches run concurrently on the
+    scheduler's worker pool.
+    """
+    def __init__(self, root, scheduler: JobScheduler = None, on_node_done: Optional[Callable] = None,
+                 priority: Priority = Priority.OPERATION):
+        self.root = root
+        self.scheduler = scheduler or JobScheduler()
+        self.on_node_done = on_node_done
+        self.priority = priority
+        self.token = CancellationToken()
+        self.future = Future()
+        self.total = sum(1 for _ in root.walk()) - 1
+        self.completed = 0
+        self.failed = {}
+        self.skipped = 0  # descendants of failed or cancelled nodes, left without an output
+        self._outstanding = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.total == 0:
+            self.future.set_result(self)
+            return self
+        self._submit_children(self.root)
+        return self
+
+    def cancel(self):
+        """Stop submitting nodes, nodes not yet computed are left without an output and no longer pending"""
+        self.token.cancel()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def _submit_children(self, node):
+        with self._lock:
+            self._outstanding += len(node.next_nodes)
+        for child in node.next_nodes:
+            self.scheduler.submit(self.priority, self._run_node, child)
+
+    def _skip(self, node, error):
+        with self._lock:
+            self.skipped += 1
+            self.completed += 1
+        if self.on_node_done:
+            self.on_node_done(node, error)
+
+    def _run_node(self, node):
+        error = None
+        try:
+            self.token.raise_if_cancelled()
+            details = node.operation_details
+            operation = get_operation(details.operation_name)
+            parent = node.previous_node
+            image, color_space = operation.prepare_input(parent)
+            node.output = operation.run(image, details.parameters, color_space=color_space)
+            node.color_space = operation.output_space(parent.color_space, details.parameters)
+            node.reversible = operation.is_reversible(parent.color_space)
+            node.pending = False
+        except OperationCancelled as e:
+            error = e
+        except Exception as e:
+            error = e
+            self.failed[node.node_id] = e
+        try:
+            if error is not None:
+                # Nothing recomputes this subtree any more, it keeps no output and stops being pending
+                for descendant in node.walk():
+                    descendant.pending = False
+                    if descendant is not node:
+                        self._skip(descendant, error)
+            if self.on_node_done:
+                self.on_node_done(node, error)
+            if error is None:
+                self._submit_children(node)
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+                self.completed += 1
+                finished = self._outstanding == 0
+            if finished:
+                self.future.set_result(self)
@@ -0,0 +1,224 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import cv2
+
+from .colorSpace import BGR, GRAY, BGRA, RGBA, convert_color
+from .imageLoader import load_image
+from .metrics import MetricsRegistry
+from .recipe import apply_recipe
+from .scheduler import JobScheduler, Priority
+from pkg.utils.fileHelper import EXPORTS_TOTAL, EXPORT_BYTES, EXPORT_SECONDS
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".ppm", ".pgm", ".bmp", ".tif", ".tiff", ".npy", ".raw")
+
+WATCH_FILES = MetricsRegistry().counter("i2c_watch_files_total", "Watch folder files processed, by outcome", ("status",))
+WATCH_FILE_SECONDS = MetricsRegistry().histogram("i2c_watch_file_duration_seconds", "Load, recipe and write time per watched file")
+
+
+def write_image_atomic(path: str, image, color_space: str):
+    """Encode to a temporary file next to the target and rename it into place"""
+    started = time.perf_counter()
+    if color_space in (BGRA, RGBA):
+        image = convert_color(image, color_space, BGRA)
+    elif color_space != GRAY:
+        image = convert_color(image, color_space, BGR)
+    extension = os.path.splitext(path)[1]
+    ok, encoded = cv2.imencode(extension, image)
+    if not ok:
+        EXPORTS_TOTAL.inc(1, "failed")
+        raise ValueError(f"Unable to encode {path}")
+    folder = os.path.dirname(path) or "."
+    descriptor, temp_path = tempfile.mkstemp(prefix=".tmp-", suffix=extension, dir=folder)
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(encoded.tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        EXPORTS_TOTAL.inc(1, "failed")
+        raise
+    EXPORTS_TOTAL.inc(1, "ok")
+    EXPORT_BYTES.inc(encoded.nbytes)
+    EXPORT_SECONDS.observe(time.perf_counter() - started)
+
+
+class WatchLedger:
+    """Append-only JSON lines record of processed files, survives restarts"""
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    line = line.strip()
+                    if line:
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    @staticmethod
+    def key(path: str, stat: os.stat_result) -> str:
+        """Files are identified by name, size and modification time, so replaced files run again"""
+        return f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def record(self, key: str, status: str, **details):
+        entry = {"key": key, "status": status, "time": datetime.now().isoformat(), **details}
+        with self._lock:
+            self.entries[key] = entry
+            with open(self.path, "a") as file:
+                file.write(json.dumps(entry) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+
+class WatchFolder:
+    """
+    Processes images dropped into a folder with a saved recipe.
+
+    A file is picked up once its size and modification time stayed the same
+    for `settle_polls` scans. At most `queue_size` files are queued or
+    running at a time; while that limit is reached the scanner stops
+    enqueueing and the remaining files wait for a later scan. Outputs keep
+    the source extension in their name, so a.jpg and a.png don't collide.
+    """
+    def __init__(self, input_dir: str, output_dir: str, steps: List[dict], ledger_path: Optional[str] = None,
+                 queue_size: int = 64, poll_interval: float = 1.0, settle_polls: int = 2,
+                 output_format: str = "png", scheduler: Optional[JobScheduler] = None):
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.steps = steps
+        self.poll_interval = poll_interval
+        self.settle_polls = settle_polls
+        self.output_format = output_format.lstrip(".")
+        self.scheduler = scheduler or JobScheduler()
+        os.makedirs(output_dir, exist_ok=True)
+        self.ledger = WatchLedger(ledger_path or os.path.join(output_dir, ".ledger.jsonl"))
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._in_flight = set()
+        self._queued: Dict[str, Future] = {}
+        self._candidates: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        MetricsRegistry().register_collector("watch", self._collect_metrics)
+
+    def _collect_metrics(self):
+        yield "i2c_watch_queue_depth", "gauge", "Watch folder files queued or running", {}, self.queue_depth()
+        yield "i2c_watch_queue_limit", "gauge", "Maximum watch folder files queued or running", {}, self.queue_size
+
+    def scan(self) -> int:
+        """Enqueue files that became stable, returns how many were enqueued"""
+        enqueued = 0
+        seen = set()
+        with os.scandir(self.input_dir) as entries:
+            names = sorted(entry.name for entry in entries if entry.is_file())
+        for name in names:
+            if name.startswith(".") or not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(self.input_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            key = WatchLedger.key(path, stat)
+            seen.add(path)
+            with self._lock:
+                if key in self.ledger or key in self._in_flight:
+                    continue
+            signature, stable_polls = self._candidates.get(path, (None, 0))
+            stable_polls = stable_polls + 1 if signature == key else 1
+            self._candidates[path] = (key, stable_polls)
+            if stable_polls < self.settle_polls:
+                continue
+            # Backpressure: no free slot means the queue is full, leave the rest for a later scan
+            if not self._slots.acquire(blocking=False):
+                break
+            with self._lock:
+                self._in_flight.add(key)
+            del self._candidates[path]
+            future = self.scheduler.submit(Priority.BATCH, self._process, path, key)
+            with self._lock:
+                if key in self._in_flight:
+                    self._queued[key] = future
+            future.add_done_callback(lambda done, key=key: self._finish(key) if done.cancelled() else None)
+            enqueued += 1
+        for path in list(self._candidates):
+            if path not in seen:
+                del self._candidates[path]
+        return enqueued
+
+    def _process(self, path: str, key: str):
+        started = time.perf_counter()
+        with self._lock:
+            self._queued.pop(key, None)
+        try:
+            image, color_space = load_image(path)
+            output, output_space = apply_recipe(image, color_space, self.steps)
+            output_path = os.path.join(self.output_dir, f"{os.path.basename(path)}.{self.output_format}")
+            write_image_atomic(output_path, output, output_space)
+            self.ledger.record(key, "done", source=path, output=output_path)
+            with self._lock:
+                self.processed += 1
+            WATCH_FILES.inc(1, "done")
+        except Exception as e:
+            self.ledger.record(key, "failed", source=path, error=str(e))
+            with self._lock:
+                self.failed += 1
+            WATCH_FILES.inc(1, "failed")
+        finally:
+            WATCH_FILE_SECONDS.observe(time.perf_counter() - started)
+            self._finish(key)
+
+    def _finish(self, key: str):
+        """Free the slot of a file that was processed or cancelled before it started"""
+        with self._idle:
+            self._queued.pop(key, None)
+            self._in_flight.discard(key)
+            self._idle.notify_all()
+        self._slots.release()
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def run(self):
+        """Scan until stop() is called"""
+        while not self.stop_event.is_set():
+            self.scan()
+            self.stop_event.wait(self.poll_interval)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop scanning, cancel files that did not start and wait for the running ones to be written
+
+        Files that were cancelled are not in the ledger, so they run again on the next start.
+
+        Returns:
+            bool: False when running files were still busy after timeout seconds
+        """
+        self.stop()
+        with self._lock:
+            queued = list(self._queued.values())
+        for future in queued:
+            future.cancel()
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._in_flight, timeout)
@@ -1,12 +1,20 @@
 import ttkbootstrap as ttk
 import sys
+import time
 
 from devopsnextgenx.components.StatusBar import StatusBar
 from pkg.ui.menu.menuFrame import MenuFrame
 from pkg.core.history.HistoryManager import HistoryManager
 from pkg.core.imageProcessUtils import ImageProcessor
 from pkg.ui.components.TreePreviewComponent import TreePreviewComponent
+from pkg.ui.components.LiveParameterDialog import LiveParameterDialog
+from pkg.ui.components.CompareView import CompareView
+from pkg.ui.uiDispatcher import get_dispatcher
+from pkg.core.operationContext import OperationCancelled
+from pkg.core.sessionLog import SessionRecorder, file_hash
+from pkg.utils.cmdArgs import getCmdArgs
 from ttkbootstrap.constants import BOTH
+from tkinter import messagebox
 
 class AppWindow(ttk.Window):
     def __init__(self):
@@ -21,6 +29,9 @@ class AppWindow(ttk.Window):
             self.attributes('-zoomed', True)
         
         self.inputFile = None
+        self.active_job = None
+        self.live_dialog = None
+        self.dispatcher = get_dispatcher(self)
 
         # Add status bar at the bottom
         self.status_bar = StatusBar(self, progress_thickness=5)
@@ -36,7 +47,10 @@ class AppWindow(ttk.Window):
                                     callbacks = {
                                        "on_file_open": self.load_image,
                                        "on_gray_scale": self.convertToGray,
-                                       "on_rgb": self.convertBGR2RGB
+                                       "on_rgb": self.convertBGR2RGB,
+                                       "on_live_operation": self.open_live_operation,
+                                       "on_cancel": self.cancel_operation,
+                                       "on_rebase": self.rebase_tree
                                     })
         self.menuFrame.pack_propagate(False)  # Prevent frame from shrinking
         self.menuFrame.pack(side="left", fill="y")
@@ -56,15 +70,48 @@ class AppWindow(ttk.Window):
 
         # Get singleton instances instead of creating new ones
         self.image_processor = ImageProcessor(status_bar=self.status_bar)
+        args = getCmdArgs()
+        self.image_processor.scheduler.configure(workers=args.workers, cv_threads=args.cv_threads,
+                                                 batch_workers=args.batch_workers)
+        if args.compress_history:
+            self.image_processor.history_manager.enable_buffer_compression(hot_capacity=args.hot_buffers)
+        self.recorder = SessionRecorder(args.record) if args.record else None
         
         # Move treePreview into content_frame and ensure it fills properly
         self.treePreview = TreePreviewComponent(parent=self.content_frame, default_position="LEFT")
         self.treePreview.pack(fill=BOTH, expand=True, padx=5, pady=5)
+        self.treePreview.compaction_done_callback = self.on_compaction_done
+        self.treePreview.compaction_guard = self.history_busy_reason
+        self.treePreview.tree_component.set_compare_callback(lambda node_a, node_b: CompareView(self, node_a, node_b))
+        self.treePreview.node_selected_callback = self.on_node_selected
+        self.treePreview.preview_component.layout_changed_callback = self.on_layout_changed
 
         # Bind mouse events for resizing
         self.resize_frame.bind("<Button-1>", self.start_resize)
         self.resize_frame.bind("<B1-Motion>", self.do_resize)
 
+        # Escape cancels the running operation
+        self.bind("<Escape>", self.cancel_operation)
+
+
+    def record(self, event, **fields):
+        """Add an action to the session log when recording"""
+        if self.recorder is not None:
+            self.recorder.record(event, **fields)
+
+    def on_node_selected(self, node, elapsed):
+        self.record("select", node=node.node_id, duration_ms=round(elapsed * 1000, 2),
+                    **self.treePreview.preview_component.preview_sizes())
+
+    def on_layout_changed(self, position):
+        self.record("layout", position=position, **self.treePreview.preview_component.preview_sizes())
+
+    def record_nodes(self, nodes, source):
+        for node in nodes:
+            details = node.operation_details
+            self.record("operation", operation=details.operation_name, parameters=details.parameters,
+                        parent=node.previous_node.node_id, node=node.node_id,
+                        duration_ms=node.metrics.get("duration_ms"), source=source)
 
     def start_resize(self, event):
         self.x = event.x
@@ -86,20 +133,158 @@ class AppWindow(ttk.Window):
         component.configure(width=new_width)
 
     def load_image(self, file_path):
+        started = time.perf_counter()
+        try:
+            self.image_processor.load_image(file_path)
+        except (ValueError, OSError) as e:
+            # Refused or unreadable, the current history stays as it was
+            self.status_bar.update_status(str(e))
+            messagebox.showerror("Unable to open image", str(e))
+            return
         self.inputFile = file_path
-        self.image_processor.load_image(file_path)
+        elapsed = time.perf_counter() - started
+        if self.recorder is not None:
+            self.record("open", file=file_path, sha256=file_hash(file_path),
+                        node=self.image_processor.history_manager.root_node.node_id,
+                        strategy=self.image_processor.history_manager.open_plan.strategy,
+                        duration_ms=round(elapsed * 1000, 2))
         self.treePreview.populate_tree(self.image_processor.history_manager.root_node)
 
     def convertBGR2RGB(self):
+        self.run_operation("RGB")
+
+    def convertToGray(self):
+        self.run_operation("Grayscale")
+
+    def run_operation(self, operation_name, parameters=None):
+        """Run an operation in the background with progress shown in the status bar"""
         if not self.inputFile:
             return
-        
-        self.image_processor.convertBGR2RGB()
+        if self.active_job is not None and not self.active_job.done():
+            self.status_bar.update_status("Another operation is still running")
+            return
+
+        self.image_processor.update_progress(0)
+        on_progress = lambda value: self.dispatcher.post(self.image_processor.update_progress, value)
+        targets = self.image_processor.history_manager.get_target_nodes()
+        try:
+            if len(targets) > 1:
+                # Several nodes selected, compute them concurrently and add all children at once
+                self.active_job = self.image_processor.submit_operation_many(operation_name, targets, parameters,
+                                                                             on_progress=on_progress)
+                job = self.active_job
+                job.future.add_done_callback(lambda future: self.dispatcher.post(self.on_batch_operation_done, job))
+                return
+            self.active_job = self.image_processor.submit_operation(operation_name, parameters, on_progress=on_progress)
+        except ValueError as e:
+            # Source node without output, e.g. still pending after a cancelled rebase
+            self.status_bar.update_status(str(e))
+            return
+        job = self.active_job
+        job.future.add_done_callback(lambda future: self.dispatcher.post(self.on_operation_done, job))
+
+    def on_operation_done(self, job):
+        """Commit a finished job on the Tk thread, cancelled or failed jobs leave history untouched"""
+        if job is self.active_job:
+            self.active_job = None
+        self.image_processor.update_progress(0)
+        try:
+            output = job.future.result()
+        except OperationCancelled:
+            self.status_bar.update_status(f"Cancelled {job.operation_name}")
+            return
+        except Exception as e:
+            self.status_bar.update_status(f"{job.operation_name} failed: {e}")
+            return
+
+        metrics = {"duration_ms": round(job.elapsed * 1000, 1)} if job.elapsed is not None else None
+        node = self.image_processor.commit_operation(job.operation_name, output, job.parameters,
+                                                     parent_node=job.parent_node, metrics=metrics)
+        self.record_nodes([node], "menu")
         self.treePreview.populate_tree(self.image_processor.history_manager.root_node)
 
-    def convertToGray(self):
+    def on_batch_operation_done(self, batch):
+        """Commit every finished job of a batch in one history and tree update"""
+        if batch is self.active_job:
+            self.active_job = None
+        self.image_processor.update_progress(0)
+        nodes, errors = self.image_processor.commit_operations(batch.jobs)
+        self.record_nodes(nodes, "batch")
+        self.treePreview.add_nodes(nodes)
+        if batch.cancelled:
+            self.status_bar.update_status(f"Cancelled {batch.operation_name}, {len(nodes)} of {len(batch.jobs)} nodes applied")
+        elif errors:
+            self.status_bar.update_status(f"{batch.operation_name} failed on {len(errors)} of {len(batch.jobs)} nodes")
+
+    def history_busy_reason(self):
+        """Why the history tree can not be restructured right now, None when it can"""
+        # Cleared once the result was committed on the Tk thread, not when the worker finished
+        if self.active_job is not None:
+            return "Wait for the running operation or rebase to finish, or cancel it with Escape"
+        if self.live_dialog is not None and self.live_dialog.winfo_exists():
+            return "Close the live parameter dialog first"
+        return None
+
+    def on_compaction_done(self, action, node, message, released):
+        self.status_bar.update_status(message)
+        self.record("compact", action=action, node=node.node_id, released=released)
+
+    def cancel_operation(self, event=None):
+        if self.active_job is not None:
+            self.active_job.cancel()
+
+    def rebase_tree(self, file_path):
+        """Re-run the whole history tree on another image, nodes fill in as they complete"""
         if not self.inputFile:
             return
-        
-        self.image_processor.convertToGray()
+        if self.active_job is not None and not self.active_job.done():
+            self.status_bar.update_status("Another operation is still running")
+            return
+
+        try:
+            self.active_job = self.image_processor.rebase_tree(
+                file_path, on_node_done=lambda node, error: self.dispatcher.post(self.on_rebase_node_done, node, error))
+        except (ValueError, OSError) as e:
+            self.status_bar.update_status(str(e))
+            messagebox.showerror("Unable to open image", str(e))
+            return
+        self.inputFile = file_path
+        if self.recorder is not None:
+            self.record("rebase", file=file_path, sha256=file_hash(file_path))
+        self.image_processor.update_progress(0)
+        self.treePreview.populate_tree(self.image_processor.history_manager.root_node)
+        job = self.active_job
+        job.future.add_done_callback(lambda future: self.dispatcher.post(self.on_rebase_done, job))
+
+    def on_rebase_node_done(self, node, error):
+        self.treePreview.refresh_node(node)
+        if self.active_job is not None and self.active_job.total:
+            self.image_processor.update_progress(self.active_job.completed / self.active_job.total)
+
+    def on_rebase_done(self, job):
+        if job is self.active_job:
+            self.active_job = None
+        self.image_processor.update_progress(0)
+        if job.token.cancelled:
+            self.status_bar.update_status(f"Rebase cancelled, {job.skipped} nodes were not recomputed")
+        elif job.failed:
+            self.status_bar.update_status(f"Rebase finished, {len(job.failed)} nodes failed")
+        else:
+            self.status_bar.update_status(f"Rebased {job.total} nodes")
+
+    def open_live_operation(self, operation_name):
+        if not self.inputFile:
+            return
+        try:
+            self.image_processor.check_source(self.image_processor.history_manager.get_active_node())
+        except ValueError as e:
+            self.status_bar.update_status(str(e))
+            return
+
+        self.live_dialog = LiveParameterDialog(self, self.image_processor, operation_name,
+                                               self.treePreview.preview_component,
+                                               on_commit=self.on_live_commit)
+
+    def on_live_commit(self, node):
+        self.record_nodes([node], "live")
         self.treePreview.populate_tree(self.image_processor.history_manager.root_node)
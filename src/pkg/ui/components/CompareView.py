@@ -0,0 +1,127 @@
+from ttkbootstrap.constants import BOTH, X, LEFT, RIGHT, TOP, W
+
+from ...core.colorSpace import RGB
+from ...core.compare import compare_nodes, display_pair
+from ...core.renderUtils import render_fit
+from ...core.scheduler import JobScheduler, Priority
+from ..uiDispatcher import get_dispatcher
+from .TreePreviewComponent import ImagePreview
+
+import ttkbootstrap as tb
+import tkinter as tk
+
+
+class CompareView(tb.Toplevel):
+    """Two nodes side by side, as a swipe or as a difference heatmap, with PSNR/SSIM statistics"""
+    MODES = ("Side by side", "Swipe", "Difference")
+
+    def __init__(self, master, node_a, node_b):
+        super().__init__(master)
+        self.title(f"Compare {self._label(node_a)} / {self._label(node_b)}")
+        self.geometry("1200x700")
+        self.node_a = node_a
+        self.node_b = node_b
+        self.dispatcher = get_dispatcher(self)
+        self.result = None
+        self._fitted = None  # (container size, fitted A, fitted B) for swiping
+        # Both sides are shown at the same size, built off the Tk thread and shared with the comparison
+        self.rgb_a = None
+        self.rgb_b = None
+
+        toolbar = tb.Frame(self)
+        toolbar.pack(side=TOP, fill=X, padx=10, pady=5)
+        self.mode_var = tk.StringVar(value=self.MODES[0])
+        for mode in self.MODES:
+            tb.Radiobutton(toolbar, text=mode, value=mode, variable=self.mode_var,
+                           command=self.update_mode).pack(side=LEFT, padx=5)
+        self.swipe_scale = tb.Scale(toolbar, from_=0, to=100, value=50, command=lambda value: self.render_swipe())
+        self.swipe_scale.pack(side=LEFT, fill=X, expand=True, padx=10)
+        self.stats_label = tb.Label(self, text="Loading...", anchor=W)
+        self.stats_label.pack(side=TOP, fill=X, padx=10)
+
+        self.body = tb.Frame(self)
+        self.body.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        self.preview_a = ImagePreview(self.body)
+        self.preview_b = ImagePreview(self.body)
+        self.preview_a.bind("<Configure>", self._on_resize, add="+")
+
+        self.update_mode()
+        JobScheduler().submit(Priority.INTERACTIVE, display_pair, node_a, node_b).add_done_callback(
+            lambda future: self.dispatcher.post(self._on_pair, future))
+
+    def _on_pair(self, future):
+        if not self.winfo_exists():
+            return
+        try:
+            pair = future.result()
+        except Exception as e:
+            self.stats_label.config(text=f"Comparison failed: {e}")
+            return
+        self.rgb_a, self.rgb_b, _ = pair
+        self.stats_label.config(text="Comparing...")
+        self.update_mode()
+        compare_nodes(self.node_a, self.node_b, pair=pair).add_done_callback(
+            lambda future: self.dispatcher.post(self._on_result, future))
+
+    @staticmethod
+    def _label(node) -> str:
+        return f"{node.operation_details.operation_name} #{node.node_id}"
+
+    def _on_result(self, future):
+        if not self.winfo_exists():
+            return
+        try:
+            self.result = future.result()
+        except Exception as e:
+            self.stats_label.config(text=f"Comparison failed: {e}")
+            return
+        result = self.result
+        psnr = "identical" if result.psnr == float("inf") else f"{result.psnr:.2f} dB"
+        resized = ", B resized to A" if result.resized else ""
+        self.stats_label.config(
+            text=f"PSNR {psnr}   SSIM {result.ssim:.4f}   MSE {result.mse:.2f}   "
+                 f"changed {result.changed_pixels} px ({result.changed_ratio:.2%})   max diff {result.max_diff}   "
+                 f"{result.elapsed * 1000:.0f} ms{resized}")
+        if self.mode_var.get() == "Difference":
+            self.update_mode()
+
+    def update_mode(self):
+        """Show both previews side by side, or one preview for swiping and the heatmap"""
+        mode = self.mode_var.get()
+        self.preview_a.pack(side=LEFT, fill=BOTH, expand=True)
+        if mode == "Side by side":
+            self.preview_b.pack(side=RIGHT, fill=BOTH, expand=True)
+            self.preview_a.set_title(f"A: {self._label(self.node_a)}")
+            self.preview_b.set_title(f"B: {self._label(self.node_b)}")
+            self.preview_a.set_image_from_array(self.rgb_a, RGB)
+            self.preview_b.set_image_from_array(self.rgb_b, RGB)
+        else:
+            self.preview_b.pack_forget()
+            self.preview_b.clear_image()
+            if mode == "Swipe":
+                self.preview_a.set_title(f"A: {self._label(self.node_a)}  |  B: {self._label(self.node_b)}")
+                self.render_swipe()
+            elif self.result is not None:
+                self.preview_a.set_title("Absolute difference")
+                self.preview_a.set_image_from_array(self.result.heatmap, RGB)
+            else:
+                self.preview_a.set_title("Absolute difference, computing...")
+                self.preview_a.clear_image()
+
+    def render_swipe(self):
+        """A left of the swipe position and B right of it, composed at display size"""
+        if self.mode_var.get() != "Swipe" or self.rgb_a is None:
+            return
+        size = self.preview_a._container_size()
+        if self._fitted is None or self._fitted[0] != size:
+            self._fitted = (size, render_fit(self.rgb_a, *size), render_fit(self.rgb_b, *size))
+        _, fitted_a, fitted_b = self._fitted
+        frame = fitted_a.copy()
+        x = min(frame.shape[1] - 1, int(frame.shape[1] * float(self.swipe_scale.get()) / 100))
+        frame[:, x:] = fitted_b[:, x:]
+        frame[:, x] = 255
+        self.preview_a.set_image_from_array(frame, RGB)
+
+    def _on_resize(self, event):
+        if self.mode_var.get() == "Swipe":
+            self.after_idle(self.render_swipe)
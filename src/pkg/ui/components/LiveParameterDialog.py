@@ -0,0 +1,67 @@
+from ttkbootstrap.constants import BOTH, X, LEFT, RIGHT, W
+
+from ...core.operations import get_operation
+from ..uiDispatcher import get_dispatcher
+
+import ttkbootstrap as tb
+
+
+class LiveParameterDialog(tb.Toplevel):
+    """Sliders for a parameterized operation with live preview while dragging"""
+    def __init__(self, master, image_processor, operation_name: str, preview_component, on_commit=None):
+        super().__init__(master)
+        self.title(operation_name)
+        self.image_processor = image_processor
+        self.operation = get_operation(operation_name)
+        self.preview_component = preview_component
+        self.on_commit = on_commit
+        self.dispatcher = get_dispatcher(self)
+        self.session = image_processor.start_live_preview(operation_name, on_preview=self._on_preview_ready)
+
+        self.variables = {}
+        self.value_labels = {}
+        for spec in self.operation.parameters:
+            frame = tb.Frame(self)
+            frame.pack(fill=X, padx=10, pady=5)
+            tb.Label(frame, text=f"{spec.name}:", width=12, anchor=W).pack(side=LEFT)
+            value_label = tb.Label(frame, text=str(spec.default), width=6)
+            value_label.pack(side=RIGHT)
+            scale = tb.Scale(frame, from_=spec.minimum, to=spec.maximum, value=spec.default,
+                             command=lambda value, name=spec.name: self._on_slide(name, value))
+            scale.pack(side=LEFT, fill=BOTH, expand=True, padx=5)
+            # Full resolution run happens once when the slider is released
+            scale.bind("<ButtonRelease-1>", self._on_release)
+            self.variables[spec.name] = spec.default
+            self.value_labels[spec.name] = value_label
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.session.preview(self.variables)
+
+    def _on_slide(self, name, value):
+        spec = next(spec for spec in self.operation.parameters if spec.name == name)
+        self.variables[name] = spec.clamp(float(value))
+        self.value_labels[name].config(text=str(self.variables[name]))
+        self.session.preview(dict(self.variables))
+
+    def _on_preview_ready(self, output, parameters):
+        """Called from the preview worker, hand the proxy result to the Tk thread"""
+        self.dispatcher.post(self.preview_component.output_preview.set_image_from_array, output, self.session.output_space)
+
+    def _on_release(self, event=None):
+        future = self.session.commit(dict(self.variables))
+        future.add_done_callback(lambda done: self.dispatcher.post(self._on_commit_ready, done))
+
+    def _on_commit_ready(self, future):
+        try:
+            output, parameters = future.result()
+        except Exception as e:
+            self.image_processor.update_status(f"{self.operation.name} failed: {e}")
+            return
+        node = self.image_processor.commit_operation(
+            self.operation.name, output, parameters, parent_node=self.session.source_node)
+        if self.on_commit:
+            self.on_commit(node)
+
+    def close(self):
+        self.session.close()
+        self.destroy()
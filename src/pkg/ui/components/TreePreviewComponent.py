@@ -1,19 +1,25 @@
-from ttkbootstrap.constants import BOTH, VERTICAL, HORIZONTAL, LEFT, RIGHT, TOP, BOTTOM, X, Y, PRIMARY, INFO, NW, W
+from ttkbootstrap.constants import BOTH, VERTICAL, HORIZONTAL, LEFT, RIGHT, TOP, BOTTOM, X, Y, PRIMARY, INFO, NW, W, CENTER
 from datetime import datetime
 from tkinter import ttk
 from typing import Literal
 from PIL import Image, ImageTk
 from tkinter import messagebox
-from ...utils.fileHelper import saveImage
+from ...utils.fileHelper import saveImage, createOutputFolder
+from ...core.recipe import save_recipe
 
 from ...core.history.HistoryManager import HistoryManager
 from ...core.history.ImageNode import ImageNode, ProcessingDetails
+from ...core.colorSpace import RGB, to_display_rgb
+from ...core.renderUtils import DISPLAY_MAX_SIZE
+from ...core.prefetch import PreviewPrefetcher
+from ..photoBlitter import PhotoBlitter
 
 import ttkbootstrap as tb
 import tkinter as tk
 import numpy as np
 import cv2
 import os
+import time
 
 # Position type for component layout
 Position = Literal["LEFT", "RIGHT", "TOP", "BOTTOM"]
@@ -22,20 +28,31 @@ class ImagePreview(tb.Frame):
     """Base class for displaying images"""
     def __init__(self, master, **kwargs):
         super().__init__(master, **kwargs)
-        self.image_container = tb.Label(self)
+        # Letterboxing is done by centering the fitted photo on a black label
+        self.image_container = tb.Label(self, anchor=CENTER, background="black")
         self.image_container.pack(fill=BOTH, expand=True)
         self.title_label = tb.Label(self, text="Image", font=("TkDefaultFont", 10, "bold"))
         self.title_label.pack(side=BOTTOM, fill=X)
         self.current_image = None
+        self.image_loader = None  # returns the full display buffer of a prefetched image on first resize
         self.photo_image = None
+        self.rendered_size = None
+        self.blitter = PhotoBlitter()
         
         # Bind to size changes
         self.bind("<Configure>", self._on_resize)
         
+    def _container_size(self):
+        """Size available for the image, with a minimum before the widget is mapped"""
+        container_w = self.image_container.winfo_width()
+        container_h = self.image_container.winfo_height()
+        return (container_w if container_w > 1 else 300, container_h if container_h > 1 else 300)
+        
     def _on_resize(self, event):
         """Handle resize events"""
         # Only update if we have an image and the size actually changed
-        if self.current_image is not None:
+        has_image = self.current_image is not None or self.image_loader is not None
+        if has_image and self._container_size() != self.rendered_size:
             self.update_display()
             
     def set_title(self, title: str):
@@ -50,67 +67,58 @@ class ImagePreview(tb.Frame):
                 self.current_image = cv2.cvtColor(self.current_image, cv2.COLOR_BGR2RGB)
                 self.update_display()
                 
-    def set_image_from_array(self, image_array):
-        """Set image from numpy array (OpenCV/PIL compatible)"""
+    def set_image_from_array(self, image_array, color_space: str = None):
+        """Set image from numpy array (OpenCV/PIL compatible), converted once to display RGB"""
         if image_array is not None:
-            self.current_image = image_array
+            self.image_loader = None
+            self.current_image = image_array if color_space == RGB and image_array.dtype == np.uint8 \
+                else to_display_rgb(image_array, color_space, DISPLAY_MAX_SIZE)
             self.update_display()
         else:
             self.clear_image()
             
     def update_display(self):
         """Update the display with current image, resizing to fit the container"""
-        container_w = self.image_container.winfo_width()
-        container_h = self.image_container.winfo_height()
-        
-        # Default to widget size, but ensure we have some minimum
-        if container_w <= 1:
-            container_w = 300
-        if container_h <= 1:
-            container_h = 300
+        container_w, container_h = self._container_size()
+        self.rendered_size = (container_w, container_h)
 
-        if self.current_image is not None:
-            h, w = self.current_image.shape[:2]
-            
-            # Calculate aspect ratio preserved scaling
-            scale = min(container_w/w, container_h/h)
-            new_w, new_h = int(w * scale), int(h * scale)
-            
-            # Check if image is grayscale (2D) or color (3D)
-            is_grayscale = len(self.current_image.shape) == 2
-            
-            # Resize image
-            resized_img = cv2.resize(self.current_image, (new_w, new_h), interpolation=cv2.INTER_AREA)
-            
-            # Convert grayscale to RGB if needed
-            if is_grayscale:
-                resized_img = cv2.cvtColor(resized_img, cv2.COLOR_GRAY2RGB)
-            
-            # Calculate padding
-            top = (container_h - new_h) // 2
-            left = (container_w - new_w) // 2
-            
-            # Create black background of container size
-            padded_img = np.zeros((container_h, container_w, 3), dtype=np.uint8)
+        if self.current_image is None and self.image_loader is not None:
+            self.current_image = self.image_loader()
+            self.image_loader = None
+        if self.current_image is None:
+            self.image_container.config(image="")
+            return
+
+        # Frames are written into one persistent photo, a new photo is only made when the fitted size changes
+        photo = self.blitter.blit(self.current_image, container_w, container_h)
+        if photo is not self.photo_image:
+            self.photo_image = photo
+            self.image_container.config(image=self.photo_image)
             
-            # Place resized image in center
-            padded_img[top:top+new_h, left:left+new_w] = resized_img
-        else:
-            # Create black background matching container size exactly
-            padded_img = np.zeros((container_h, container_w, 3), dtype=np.uint8)
+    def set_fitted_image(self, fitted, image_loader):
+        """
+        Show a buffer already fitted to the current container size
 
-        # Convert to PIL and create PhotoImage
-        pil_img = Image.fromarray(padded_img)
-        self.photo_image = ImageTk.PhotoImage(pil_img)
-        
-        # Update label
-        self.image_container.config(image=self.photo_image)
+        Args:
+            fitted: RGB buffer fitted to the container, owned by the preview afterwards
+            image_loader: Returns the full display buffer, only called once the preview needs refitting
+        """
+        self.current_image = None
+        self.image_loader = image_loader
+        self.rendered_size = self._container_size()
+        photo = self.blitter.show(fitted)
+        if photo is not self.photo_image:
+            self.photo_image = photo
+            self.image_container.config(image=self.photo_image)
             
     def clear_image(self):
         """Clear the displayed image"""
         self.image_container.config(image="")
         self.photo_image = None
+        self.blitter.release()
         self.current_image = None
+        self.image_loader = None
+        self.rendered_size = None
 
 
 class InputPreview(ImagePreview):
@@ -127,8 +135,33 @@ class OutputPreview(ImagePreview):
         self.set_title("Output")
 
 
+class _DetailRow:
+    """Pooled label row of ProcessDetailPreview, only touches Tk when its text changes"""
+    def __init__(self, canvas):
+        self.frame = tb.Frame(canvas)
+        self.name_label = tb.Label(self.frame, text="", width=15, anchor=W)
+        self.name_label.pack(side=LEFT)
+        self.value_label = tb.Label(self.frame, text="")
+        self.value_label.pack(side=LEFT, fill=X, expand=True)
+        self.item = canvas.create_window((0, 0), window=self.frame, anchor=NW, state="hidden")
+        self.content = None
+        self.header = False
+
+    def show(self, name: str, value: str, header: bool):
+        if header != self.header:
+            font = ("TkDefaultFont", 10, "bold") if header else "TkDefaultFont"
+            self.name_label.config(font=font)
+            self.header = header
+        if self.content != (name, value):
+            self.name_label.config(text=name)
+            self.value_label.config(text=value)
+            self.content = (name, value)
+
+
 class ProcessDetailPreview(tb.Frame):
     """Component to display process details"""
+    ROW_HEIGHT = 24
+
     def __init__(self, master, **kwargs):
         super().__init__(master, **kwargs)
         self.title_label = tb.Label(self, text="Process Details", font=("TkDefaultFont", 12, "bold"))
@@ -142,89 +175,114 @@ class ProcessDetailPreview(tb.Frame):
         self.filter_entry.pack(side=LEFT, fill=X, expand=True, padx=5)
         self.filter_entry.bind("<KeyRelease>", self.apply_filter)
         
-        # Create scrollable frame for details
-        self.canvas = tk.Canvas(self)
-        scrollbar = tb.Scrollbar(self, orient=VERTICAL, command=self.canvas.yview)
-        self.details_frame = tb.Frame(self.canvas)
+        # Virtualized rows: a small pool of row widgets is moved over the visible part of the canvas
+        self.canvas = tk.Canvas(self, highlightthickness=0)
+        self.scrollbar = tb.Scrollbar(self, orient=VERTICAL, command=self.canvas.yview)
         
-        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.configure(yscrollcommand=self._on_yscroll, yscrollincrement=self.ROW_HEIGHT)
         self.canvas.pack(side=LEFT, fill=BOTH, expand=True)
-        scrollbar.pack(side=RIGHT, fill=Y)
-        
-        self.canvas_frame = self.canvas.create_window((0, 0), window=self.details_frame, anchor=NW)
+        self.scrollbar.pack(side=RIGHT, fill=Y)
         self.canvas.bind('<Configure>', self._on_canvas_configure)
-        self.details_frame.bind('<Configure>', self._on_frame_configure)
         
-        self.details = {}
+        self.row_pool = []
+        self.rows = []           # all (name, value, header, filterable) rows of the current node
+        self.visible_rows = []   # rows left after filtering
         self.current_node = None
+        self._render_pending = False
         
     def _on_canvas_configure(self, event):
-        """Update the scrollregion when the canvas is resized"""
-        self.canvas.itemconfig(self.canvas_frame, width=event.width)
-        
-    def _on_frame_configure(self, event):
-        """Reset the scroll region to encompass the inner frame"""
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        """Resize pooled rows to the canvas width and fill newly exposed space"""
+        for row in self.row_pool:
+            self.canvas.itemconfig(row.item, width=event.width)
+        self._schedule_render()
+        
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._schedule_render()
+        
+    def _schedule_render(self):
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._render_visible)
+            
+    def _render_visible(self):
+        """Bind the pooled row widgets to the rows currently in view"""
+        self._render_pending = False
+        height = max(self.canvas.winfo_height(), self.ROW_HEIGHT)
+        first = max(0, int(self.canvas.canvasy(0)) // self.ROW_HEIGHT)
+        count = height // self.ROW_HEIGHT + 2
+        while len(self.row_pool) < count:
+            row = _DetailRow(self.canvas)
+            self.canvas.itemconfig(row.item, width=self.canvas.winfo_width())
+            self.row_pool.append(row)
+            
+        for slot, row in enumerate(self.row_pool):
+            index = first + slot
+            if slot < count and index < len(self.visible_rows):
+                name, value, header, _ = self.visible_rows[index]
+                row.show(name, value, header)
+                self.canvas.coords(row.item, 0, index * self.ROW_HEIGHT)
+                self.canvas.itemconfig(row.item, state="normal")
+            else:
+                self.canvas.itemconfig(row.item, state="hidden")
+                
+    def _set_visible_rows(self, rows):
+        self.visible_rows = rows
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), len(rows) * self.ROW_HEIGHT))
+        self._schedule_render()
         
     def display_details(self, node: ImageNode):
         """Display process details for a node"""
-        # Clear existing details
-        for widget in self.details_frame.winfo_children():
-            widget.destroy()
-        
+        self.current_node = node
+        self.rows = []
         if node is None:
+            self._set_visible_rows([])
             return
-        
-        # Display operation name
-        op_frame = tb.Frame(self.details_frame)
-        op_frame.pack(fill=X, padx=5, pady=2)
-        tb.Label(op_frame, text="Operation:", width=15, anchor=W).pack(side=LEFT)
-        tb.Label(op_frame, text=node.operation_details.operation_name).pack(side=LEFT, fill=X, expand=True)
-        
-        # Display timestamp
-        time_frame = tb.Frame(self.details_frame)
-        time_frame.pack(fill=X, padx=5, pady=2)
-        tb.Label(time_frame, text="Timestamp:", width=15, anchor=W).pack(side=LEFT)
-        tb.Label(time_frame, text=str(node.operation_details.timestamp)).pack(side=LEFT, fill=X, expand=True)
-        
-        # Display parameters if available
-        if node.operation_details.parameters:
-            params_label = tb.Label(self.details_frame, text="Parameters:", font=("TkDefaultFont", 10, "bold"))
-            params_label.pack(anchor=W, padx=5, pady=2)
-            
-            # Create grid for parameters
-            row = 0
-            self.details = {}
-            for key, value in node.operation_details.parameters.items():
-                param_frame = tb.Frame(self.details_frame)
-                param_frame.pack(fill=X, padx=5, pady=1)
-                
-                # Parameter name
-                name_label = tb.Label(param_frame, text=f"{key}:", width=15, anchor=W)
-                name_label.pack(side=LEFT)
-                
-                # Parameter value
-                value_label = tb.Label(param_frame, text=str(value))
-                value_label.pack(side=LEFT, fill=X, expand=True)
+            
+        details = node.operation_details
+        self.rows.append(("Operation:", details.operation_name, False, False))
+        self.rows.append(("Timestamp:", str(details.timestamp), False, False))
+        size_text = f"{node.shape[1]}x{node.shape[0]}" if node.shape else ""
+        self.rows.append(("Format:", f"{node.color_space} {node.dtype} {size_text}", False, False))
+        
+        # Display compression ratio once the store compressed the buffer, hot buffers are not compressed for this
+        stored = node.get_compression_info()
+        if stored is not None:
+            storage_text = (f"{node.buffer_store.codec} {stored.ratio:.1f}x "
+                            f"({stored.raw_size / 1e6:.1f} MB -> {stored.compressed_size / 1e6:.1f} MB)")
+            self.rows.append(("Storage:", storage_text, False, False))
+        elif node.buffer_store is not None and node.buffer_store.is_hot(node.node_id):
+            self.rows.append(("Storage:", "hot, not compressed yet", False, False))
+            
+        # Parameters and metrics can be long, these rows are filterable
+        for title, values in (("Parameters:", details.parameters), ("Metrics:", node.metrics)):
+            if values:
+                self.rows.append((title, "", True, False))
+                self.rows.extend((f"{key}:", str(value), False, True) for key, value in values.items())
                 
-                self.details[key] = (param_frame, name_label, value_label)
-                row += 1
-        
-        # Save current node details for filtering
-        self.current_node = node
+        self.apply_filter()
         
     def apply_filter(self, event=None):
         """Apply filter to the details based on user input"""
-        if not hasattr(self, 'details') or not self.details:
+        filter_text = self.filter_entry.get().lower()
+        if not filter_text:
+            self._set_visible_rows(self.rows)
             return
             
-        filter_text = self.filter_entry.get().lower()
-        
-        for key, (frame, name_label, value_label) in self.details.items():
-            if filter_text in key.lower() or filter_text in str(value_label.cget("text")).lower():
-                frame.pack(fill=X, padx=5, pady=1)
-            else:
-                frame.pack_forget()
+        rows = []
+        header = None
+        for row in self.rows:
+            name, value, is_header, filterable = row
+            if is_header:
+                header = row
+            elif not filterable:
+                rows.append(row)
+            elif filter_text in name.lower() or filter_text in value.lower():
+                if header is not None:
+                    rows.append(header)
+                    header = None
+                rows.append(row)
+        self._set_visible_rows(rows)
 
 
 class PreviewComponent(tb.Frame):
@@ -248,6 +306,11 @@ class PreviewComponent(tb.Frame):
         self.preview_container = tb.Frame(self)
         self.preview_container.pack(fill=BOTH, expand=True)
         
+        self.layout_changed_callback = None  # called with the new position
+        
+        # Previews of the nodes around the selection are rendered ahead while idle
+        self.prefetcher = PreviewPrefetcher()
+        
         # Initialize preview components
         self.create_preview_components()
         
@@ -281,11 +344,7 @@ class PreviewComponent(tb.Frame):
                     self.preview_paned.sashpos(0, height // 2)
         
     def create_preview_components(self):
-        """Create or recreate the preview components"""
-        # Clear existing components
-        for widget in self.preview_container.winfo_children():
-            widget.destroy()
-            
+        """Create the preview components, they are kept for the lifetime of the component"""
         # Create main vertical paned window to split preview and details
         self.main_paned = ttk.PanedWindow(self.preview_container, orient=tk.VERTICAL)
         self.main_paned.pack(fill=BOTH, expand=True)
@@ -297,39 +356,35 @@ class PreviewComponent(tb.Frame):
         # Calculate equal frame sizes - use 48% of container size but maintain minimum size
         frame_width = max(int(container_width * 0.48), 300)
         frame_height = max(int(container_height * 0.48), 300)
+        self.preview_height = int(container_height * 0.90)
         
         # Create horizontal/vertical paned window for input/output previews
         style = ttk.Style()
         style.configure('Preview.TPanedwindow', sashwidth=4, sashrelief='raised')
         
-        # Set orientation based on position
-        orient = tk.HORIZONTAL if self.position_var.get() in ["LEFT", "RIGHT"] else tk.VERTICAL
-        self.preview_paned = ttk.PanedWindow(self.main_paned, orient=orient, style='Preview.TPanedwindow', height=int(container_height*0.90))
+        # One paned window per orientation, created on first use and kept afterwards
+        self.preview_paneds = {}
+        self.preview_paned = self._get_preview_paned(self._preview_orient())
         
-        # Create frames with fixed minimum sizes
-        input_frame = tb.Frame(self.preview_paned, width=frame_width, height=frame_height)
-        output_frame = tb.Frame(self.preview_paned, width=frame_width, height=frame_height)
+        # Frames are children of main_paned, so they can be moved between the preview paned windows
+        self.input_frame = tb.Frame(self.main_paned, width=frame_width, height=frame_height)
+        self.output_frame = tb.Frame(self.main_paned, width=frame_width, height=frame_height)
         
         # Force frames to maintain their size
-        input_frame.pack_propagate(False)
-        output_frame.pack_propagate(False)
-        input_frame.grid_propagate(False)
-        output_frame.grid_propagate(False)
+        for frame in (self.input_frame, self.output_frame):
+            frame.pack_propagate(False)
+            frame.grid_propagate(False)
         
-        # Create new preview components inside the fixed-size frames
-        self.input_preview = InputPreview(input_frame, bootstyle=INFO)
+        # Create preview components inside the fixed-size frames
+        self.input_preview = InputPreview(self.input_frame, bootstyle=INFO)
         self.input_preview.pack(fill=BOTH, expand=True, padx=5, pady=5)
         
-        self.output_preview = OutputPreview(output_frame, bootstyle=INFO)
+        self.output_preview = OutputPreview(self.output_frame, bootstyle=INFO)
         self.output_preview.pack(fill=BOTH, expand=True, padx=5, pady=5)
         
-        # Add frames to preview paned window with equal weights
-        self.preview_paned.add(input_frame, weight=1)
-        self.preview_paned.add(output_frame, weight=1)
+        self._attach_preview_frames(self.preview_paned)
         
         # Create process details preview
-        if hasattr(self, 'process_detail_preview'):
-            self.process_detail_preview.destroy()
         self.process_detail_preview = ProcessDetailPreview(self.main_paned)
         
         # Add components to main paned window
@@ -339,46 +394,90 @@ class PreviewComponent(tb.Frame):
         # Update sash positions after widget is drawn
         self.after_idle(self._update_sash_positions)
         
+    def _preview_orient(self):
+        return tk.HORIZONTAL if self.position_var.get() in ["LEFT", "RIGHT"] else tk.VERTICAL
+        
+    def _get_preview_paned(self, orient):
+        """Get the preview paned window for an orientation, ttk can't change orient after creation"""
+        if orient not in self.preview_paneds:
+            self.preview_paneds[orient] = ttk.PanedWindow(self.main_paned, orient=orient, style='Preview.TPanedwindow',
+                                                          height=self.preview_height)
+        return self.preview_paneds[orient]
+        
+    def _attach_preview_frames(self, paned):
+        """Add both preview frames to a paned window with equal weights"""
+        paned.add(self.input_frame, weight=1)
+        paned.add(self.output_frame, weight=1)
+        # Keep the frames stacked above the paned window they are shown in
+        self.input_frame.lift(paned)
+        self.output_frame.lift(paned)
+        
     def update_preview_layout(self, event=None):
-        """Update the layout of the preview components"""
-        # Store current node if any process details are displayed
-        current_node = None
-        if hasattr(self, 'process_detail_preview') and hasattr(self.process_detail_preview, 'current_node'):
-            current_node = self.process_detail_preview.current_node
+        """Move the existing previews into the paned window for the selected layout"""
+        target = self._get_preview_paned(self._preview_orient())
+        if target is self.preview_paned:
+            return
+            
+        for frame in (self.input_frame, self.output_frame):
+            self.preview_paned.forget(frame)
+        self._attach_preview_frames(target)
         
-        # Recreate components with new layout
-        self.create_preview_components()
+        # Swap the preview pane in place, the details pane and rendered images are untouched
+        self.main_paned.insert(0, target, weight=7)
+        self.main_paned.forget(self.preview_paned)
+        self.preview_paned = target
         
-        # Reload the node data if we had any
-        if current_node:
-            self.display_node(current_node)
+        self.after_idle(self._update_sash_positions)
+        if self.layout_changed_callback:
+            self.layout_changed_callback(self.position_var.get())
+            
+    def preview_sizes(self) -> dict:
+        """Sizes available to the input and output images"""
+        return {"input": list(self.input_preview._container_size()), "output": list(self.output_preview._container_size())}
             
+    def render_stats(self) -> dict:
+        """Frames, bytes copied and photo allocations of both previews"""
+        return {"input": self.input_preview.blitter.stats(), "output": self.output_preview.blitter.stats()}
+        
     def display_node(self, node: ImageNode):
         """Display the selected node's data"""
         if node is None:
             return
             
-        # Update image previews
-        if node.input is not None:
+        # Update image previews from prefetched buffers or the nodes' cached display buffers
+        if node.previous_node is not None:
+            self._show_node_output(self.input_preview, node.previous_node)
+        elif node.input is not None:
             self.input_preview.set_image_from_array(node.input)
-        # elif hasattr(node, 'input_file') and node.input_file:
-        #     self.input_preview.set_image_from_path(node.input_file)
         else:
             self.input_preview.clear_image()
             
-        if node.output is not None:
-            self.output_preview.set_image_from_array(node.output)
-        # elif hasattr(node, 'output_file') and node.output_file:
-        #     self.output_preview.set_image_from_path(node.output_file)
+        # has_output does not decompress or page in the buffer, the display buffer is decimated from it
+        if node.has_output:
+            self._show_node_output(self.output_preview, node)
         else:
             self.output_preview.clear_image()
             
         # Update process details
         self.process_detail_preview.display_details(node)
+        
+    def _show_node_output(self, preview: ImagePreview, node: ImageNode):
+        """Show a node's output, skipping the resize when it was prefetched at the preview size"""
+        fitted = self.prefetcher.take(node, preview._container_size())
+        if fitted is not None:
+            preview.set_fitted_image(fitted, node.get_display_buffer)
+        else:
+            preview.set_image_from_array(node.get_display_buffer(), RGB)
+            
+    def prefetch_around(self, node: ImageNode):
+        """Render the previews of the nodes navigation reaches next, replacing earlier prefetches"""
+        self.prefetcher.prefetch(node, self.preview_sizes())
 
 
 class TreeComponent(tb.Frame):
     """Component to display the processing tree"""
+    SEARCH_REVEAL_LIMIT = 100
+    
     def __init__(self, master, **kwargs):
         super().__init__(master, **kwargs)
         
@@ -386,6 +485,19 @@ class TreeComponent(tb.Frame):
         self.title_label = tb.Label(self, text="Processing Tree", font=("TkDefaultFont", 12, "bold"))
         self.title_label.pack(fill=X, padx=5, pady=5)
         
+        # Search box backed by the history index
+        search_frame = tb.Frame(self)
+        search_frame.pack(fill=X, padx=5)
+        tb.Label(search_frame, text="Search:").pack(side=LEFT)
+        self.search_entry = tb.Entry(search_frame)
+        self.search_entry.pack(side=LEFT, fill=X, expand=True, padx=5)
+        self.search_entry.bind("<KeyRelease>", self._on_search_changed)
+        self.search_count_label = tb.Label(search_frame, text="")
+        self.search_count_label.pack(side=RIGHT)
+        self.search_callback = None
+        self.matched_items = set()
+        self._search_after_id = None
+        
         # Create scrollable treeview
         self.tree_frame = tb.Frame(self)
         self.tree_frame.pack(fill=BOTH, expand=True, padx=5, pady=5)
@@ -398,7 +510,7 @@ class TreeComponent(tb.Frame):
         self.tree = ttk.Treeview(self.tree_frame, 
                                 yscrollcommand=self.tree_y_scroll.set,
                                 xscrollcommand=self.tree_x_scroll.set,
-                                selectmode='browse',
+                                selectmode='extended',
                                 style='Custom.Treeview')
         
         # Configure style for treeview indentation
@@ -422,16 +534,29 @@ class TreeComponent(tb.Frame):
         self.tree.heading("#0", text="Operation", anchor=W)  # Operation heading
         self.tree.heading("timestamp", text="Timestamp", anchor=W)
         
+        # Nodes waiting to be recomputed are greyed out, search matches are highlighted
+        self.tree.tag_configure('pending', foreground='gray')
+        self.tree.tag_configure('match', background='#3d6a8a')
+        
         # Store nodes
         self.nodes = {}
         
-        # Bind selection event
+        # Bind selection event, children are inserted when an item is expanded
         self.tree.bind("<<TreeviewSelect>>", self.on_item_selected)
+        self.tree.bind("<<TreeviewOpen>>", self._on_item_open)
         self.selection_callback = None
         
         # Create popup menu
         self.popup_menu = tk.Menu(self, tearoff=0)
         self.popup_menu.add_command(label="Save Output", command=self.save_selected_node)
+        self.popup_menu.add_command(label="Save Recipe", command=self.save_selected_recipe)
+        self.popup_menu.add_command(label="Compare Selected", command=self._compare_selected)
+        self.compare_callback = None
+        self.popup_menu.add_separator()
+        self.popup_menu.add_command(label="Delete Branch", command=lambda: self._compact_selected("delete_branch"))
+        self.popup_menu.add_command(label="Keep Only This Path", command=lambda: self._compact_selected("keep_path"))
+        self.popup_menu.add_command(label="Collapse Chain", command=lambda: self._compact_selected("collapse_chain"))
+        self.compaction_callback = None
         
         # Bind right click to show popup menu
         self.tree.bind("<Button-3>", self.show_popup_menu)
@@ -441,8 +566,12 @@ class TreeComponent(tb.Frame):
         # Get item under cursor
         item = self.tree.identify_row(event.y)
         if item:
-            # Select the item
-            self.tree.selection_set(item)
+            # Select the item, keeping a multi selection it is part of
+            if item not in self.tree.selection():
+                self.tree.selection_set(item)
+            self.tree.focus(item)
+            self.popup_menu.entryconfigure("Compare Selected",
+                                           state="normal" if len(self.tree.selection()) == 2 else "disabled")
             # Show popup menu
             self.popup_menu.post(event.x_root, event.y_root)
             
@@ -467,56 +596,244 @@ class TreeComponent(tb.Frame):
             else:
                 messagebox.showwarning("Warning", "No output image available to save")
                 
+    def save_selected_recipe(self):
+        """Save the operations leading to the selected node as a recipe for watch mode"""
+        selected_items = self.tree.selection()
+        if not selected_items or selected_items[0] not in self.nodes:
+            return
+        node = self.nodes[selected_items[0]]
+        try:
+            createOutputFolder("output")
+            filename = os.path.join("output", f"{node.operation_details.operation_name}.recipe.json")
+            save_recipe(filename, node.get_processing_chain())
+            messagebox.showinfo("Success", f"Recipe saved as {filename}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save recipe: {str(e)}")
+                
+    def set_compaction_callback(self, callback):
+        """Set callback function called with (action, node) for the history compaction menu entries"""
+        self.compaction_callback = callback
+        
+    def set_compare_callback(self, callback):
+        """Set callback function called with two nodes to compare"""
+        self.compare_callback = callback
+        
+    def _compare_selected(self):
+        nodes = self.selected_nodes()
+        if len(nodes) == 2 and self.compare_callback:
+            self.compare_callback(*nodes)
+            
+    def _compact_selected(self, action):
+        item_id = self.tree.focus()
+        if item_id in self.nodes and self.compaction_callback:
+            self.compaction_callback(action, self.nodes[item_id])
+            
     def set_selection_callback(self, callback):
         """Set callback function for tree selection"""
         self.selection_callback = callback
         
+    def set_search_callback(self, callback):
+        """Set callback function returning the nodes matching a query"""
+        self.search_callback = callback
+        
+    def _on_search_changed(self, event=None):
+        """Debounce key strokes so fast typing runs a single query"""
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(120, self.apply_search)
+        
+    def _set_item_tag(self, item_id, tag, enabled):
+        tags = set(self.tree.item(item_id, "tags"))
+        if enabled:
+            tags.add(tag)
+        else:
+            tags.discard(tag)
+        self.tree.item(item_id, tags=tuple(tags))
+        
+    def apply_search(self):
+        """Highlight and reveal the nodes matching the search box, without rebuilding the tree"""
+        self._search_after_id = None
+        for item_id in self.matched_items:
+            if self.tree.exists(item_id):
+                self._set_item_tag(item_id, 'match', False)
+        self.matched_items = set()
+        
+        query = self.search_entry.get().strip()
+        if not query or not self.search_callback:
+            self.search_count_label.config(text="")
+            return
+            
+        matches = self.search_callback(query)
+        self.matched_items = {self._item_id(node) for node in matches}
+        # Only the first matches are revealed, the others get highlighted when their parent is expanded
+        for node in matches[:self.SEARCH_REVEAL_LIMIT]:
+            self.reveal(node)
+        for item_id in self.matched_items:
+            if self.tree.exists(item_id):
+                self._set_item_tag(item_id, 'match', True)
+        if matches:
+            self.tree.see(self._item_id(matches[0]))
+        self.search_count_label.config(text=f"{len(matches)} found")
+        
     def on_item_selected(self, event):
-        """Handle tree item selection"""
+        """Handle tree item selection, the focused item is shown when several are selected"""
         selected_items = self.tree.selection()
         if selected_items and self.selection_callback:
-            item_id = selected_items[0]
+            item_id = self.tree.focus()
+            if item_id not in selected_items:
+                item_id = selected_items[0]
             if item_id in self.nodes:
                 self.selection_callback(self.nodes[item_id])
                 
+    def selected_nodes(self):
+        """Nodes of every selected item, focused item first"""
+        selected_items = list(self.tree.selection())
+        focus = self.tree.focus()
+        if focus in selected_items:
+            selected_items.remove(focus)
+            selected_items.insert(0, focus)
+        return [self.nodes[item_id] for item_id in selected_items if item_id in self.nodes]
+                
+    @staticmethod
+    def _item_id(node: ImageNode) -> str:
+        return f"node_{node.node_id}"
+        
+    @staticmethod
+    def _placeholder_id(item_id: str) -> str:
+        return f"{item_id}_placeholder"
+        
     def add_node(self, node: ImageNode, parent_id=""):
-        """Add a node to the tree"""
-        # Create unique ID for the node
-        node_id = f"node_{id(node)}"
+        """Add a node to the tree, its children are only inserted once it is expanded"""
+        # Item IDs come from the node id, so they stay the same across repopulating
+        node_id = self._item_id(node)
+        tags = ['pending'] if node.pending else []
+        if node_id in self.matched_items:
+            tags.append('match')
         
         # Add to treeview - now with operation name in text field
-        tree_id = self.tree.insert(
+        self.tree.insert(
             parent_id, "end", 
             iid=node_id,
             text=node.operation_details.operation_name,  # Operation name as text
-            values=(node.operation_details.timestamp.strftime("%Y-%m-%d %H:%M:%S"),)  # Timestamp only
+            values=(node.operation_details.timestamp.strftime("%Y-%m-%d %H:%M:%S"),),  # Timestamp only
+            tags=tuple(tags)
         )
         
         # Store node reference
         self.nodes[node_id] = node
         
-        # Add child nodes recursively
-        for child_node in node.next_nodes:
-            self.add_node(child_node, node_id)
+        # A placeholder child keeps the expand indicator until the real children are inserted
+        if node.next_nodes:
+            self.tree.insert(node_id, "end", iid=self._placeholder_id(node_id), text="...")
             
         return node_id
         
+    def _ensure_children(self, item_id):
+        """Replace the placeholder of an item with the items of its child nodes"""
+        placeholder_id = self._placeholder_id(item_id)
+        if not self.tree.exists(placeholder_id):
+            return
+        self.tree.delete(placeholder_id)
+        for child_node in self.nodes[item_id].next_nodes:
+            self.add_node(child_node, item_id)
+            
+    def expand(self, item_id):
+        """Open an item, inserting its children first"""
+        self._ensure_children(item_id)
+        self.tree.item(item_id, open=True)
+        
+    def _on_item_open(self, event):
+        # Tk focuses the item before opening it, by mouse or keyboard
+        item_id = self.tree.focus()
+        if item_id in self.nodes:
+            self._ensure_children(item_id)
+            
+    def reveal(self, node: ImageNode):
+        """Insert and open the ancestors of a node so its item exists and is visible"""
+        path = []
+        current = node
+        while current is not None and not self.tree.exists(self._item_id(current)):
+            path.append(current)
+            current = current.previous_node
+        if current is None:
+            return None  # not part of the shown tree
+        # Insert the missing ancestors downwards from the deepest one already shown
+        if path:
+            for ancestor in [current] + path[:0:-1]:
+                self._ensure_children(self._item_id(ancestor))
+        item_id = self._item_id(node)
+        parent_id = self.tree.parent(item_id)
+        while parent_id:
+            self.tree.item(parent_id, open=True)
+            parent_id = self.tree.parent(parent_id)
+        return item_id
+        
+    def select_node(self, node: ImageNode):
+        """Select and show a node, inserting its ancestors when needed"""
+        item_id = self.reveal(node)
+        if item_id is not None:
+            self.tree.selection_set(item_id)
+            self.tree.focus(item_id)
+            self.tree.see(item_id)
+        return item_id
+        
+    def refresh_node(self, node: ImageNode):
+        """Update a single item after its node was recomputed"""
+        node_id = self._item_id(node)
+        if not self.tree.exists(node_id):
+            return
+        self._set_item_tag(node_id, 'pending', node.pending)
+        if node_id in self.tree.selection():
+            self.on_item_selected(None)
+            
+    def add_nodes(self, nodes):
+        """Insert new nodes under their already shown parents and select them, without rebuilding the tree"""
+        item_ids = []
+        for node in nodes:
+            parent_id = self._item_id(node.previous_node)
+            if not self.tree.exists(parent_id):
+                continue
+            if not self.tree.exists(self._item_id(node)):
+                if self.tree.exists(self._placeholder_id(parent_id)):
+                    # Children not inserted yet, expanding inserts the new node too
+                    self.expand(parent_id)
+                else:
+                    self.add_node(node, parent_id)
+            self.tree.item(parent_id, open=True)
+            item_ids.append(self._item_id(node))
+        if item_ids:
+            self.tree.selection_set(item_ids)
+            self.tree.focus(item_ids[0])
+            self.tree.see(item_ids[-1])
+            self.on_item_selected(None)
+        return item_ids
+            
     def populate_tree(self, root_node: ImageNode):
-        """Populate the tree from a root node"""
+        """Populate the tree from a root node, only inserting the items that are expanded"""
+        # Item IDs are stable, so the expanded items can be opened again after rebuilding
+        open_items = {item_id for item_id in self.nodes if self.tree.exists(item_id) and self.tree.item(item_id, "open")}
+        
         # Clear existing tree
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.tree.delete(*self.tree.get_children())
         self.nodes = {}
         
-        # Add root node and recursively add children
         if root_node:
             root_id = self.add_node(root_node)
-            # Expand root node
-            self.tree.item(root_id, open=True)
+            # Expand root and previously expanded items, level by level
+            pending = [root_id]
+            while pending:
+                item_id = pending.pop()
+                self.expand(item_id)
+                pending.extend(child_id for child_id in self.tree.get_children(item_id) if child_id in open_items)
             # Select root node
             self.tree.selection_set(root_id)
+            self.tree.focus(root_id)
             # Trigger selection event
             self.on_item_selected(None)
+        if self.search_entry.get().strip():
+            self.apply_search()
+        else:
+            self.matched_items = set()
 
 
 class TreePreviewComponent(tb.Frame):
@@ -543,8 +860,14 @@ class TreePreviewComponent(tb.Frame):
         self.preview_component = PreviewComponent(self.paned_window, bootstyle=INFO)
         self.preview_component.configure(width=400)  # Minimum width
         
-        # Set up tree selection callback
+        # Set up tree selection and search callbacks
         self.tree_component.set_selection_callback(self.on_node_selected)
+        self.tree_component.set_search_callback(self.history_manager.search)
+        self.tree_component.set_compaction_callback(self.compact_history)
+        
+        self.compaction_done_callback = None  # called with (action, node, message, bytes released)
+        self.compaction_guard = None  # returns why the history can not be compacted right now, or None
+        self.node_selected_callback = None  # called with (node, seconds spent displaying it)
         
         # Add components to paned window based on position
         self.update_layout()
@@ -610,13 +933,50 @@ class TreePreviewComponent(tb.Frame):
             
     def on_node_selected(self, node: ImageNode):
         """Handle node selection in the tree"""
+        started = time.perf_counter()
         self.preview_component.display_node(node)
-        self.history_manager.set_selected_node(node)
+        elapsed = time.perf_counter() - started
+        self.preview_component.prefetch_around(node)
+        self.history_manager.set_selected_nodes(self.tree_component.selected_nodes() or [node])
+        if self.node_selected_callback:
+            self.node_selected_callback(node, elapsed)
         
     def populate_tree(self, root_node: ImageNode):
         """Populate the tree with nodes"""
+        if root_node is not None and root_node is not self.history_manager.root_node:
+            # Tree not built through the history manager, e.g. sample data, index it once
+            self.history_manager.index.rebuild(root_node)
         self.tree_component.populate_tree(root_node)
 
+    def add_nodes(self, nodes):
+        """Show nodes added in one batch, e.g. an operation applied to several selected nodes"""
+        self.tree_component.add_nodes(nodes)
+
+    def compact_history(self, action: str, node: ImageNode):
+        """Delete a branch, keep only a path or collapse a chain, then show what was released"""
+        labels = {"delete_branch": "Deleted branch", "keep_path": "Kept only this path", "collapse_chain": "Collapsed chain"}
+        # Running jobs would commit under removed nodes or write into released ones
+        reason = self.compaction_guard() if self.compaction_guard else None
+        if reason:
+            messagebox.showwarning("Warning", reason)
+            return
+        try:
+            released = getattr(self.history_manager, action)(node)
+        except ValueError as e:
+            messagebox.showwarning("Warning", str(e))
+            return
+        self.populate_tree(self.history_manager.root_node)
+        selected = self.history_manager.selected_node
+        if selected is not None:
+            self.tree_component.select_node(selected)
+        message = f"{labels[action]}, reclaimed {released / 2 ** 20:.1f} MiB"
+        if self.compaction_done_callback:
+            self.compaction_done_callback(action, node, message, released)
+            
+    def refresh_node(self, node: ImageNode):
+        """Refresh a node that finished recomputing"""
+        self.tree_component.refresh_node(node)
+
     def on_tree_select(self, event):
         selected_item = self.tree_component.tree.selection()
         if selected_item:
@@ -648,7 +1008,8 @@ def create_sample_data():
             operation_name="RGB",
             timestamp=datetime.now(),
             parameters={"copies": 2, "spacing": 100}
-        )
+        ),
+        color_space="RGB"
     )
     root_node.add_next_node(rgb_node)
     
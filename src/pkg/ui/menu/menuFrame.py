@@ -21,16 +21,29 @@ class MenuFrame(ttk.Frame):
     
     def open_file(self):
         file_path = filedialog.askopenfilename(
-            filetypes=[("Image files", "*.png *.jpg *.jpeg *.gif *.bmp *.tiff")]
+            filetypes=[("Image files", "*.png *.jpg *.jpeg *.gif *.webp *.ppm *.pgm *.bmp *.tif *.tiff *.npy *.raw")]
         )
         if file_path and 'on_file_open' in self.callbacks:
             self.callbacks['on_file_open'](file_path)
     
+    def rebase_file(self):
+        file_path = filedialog.askopenfilename(
+            title="Rebase tree onto image",
+            filetypes=[("Image files", "*.png *.jpg *.jpeg *.gif *.webp *.ppm *.pgm *.bmp *.tif *.tiff *.npy *.raw")]
+        )
+        if file_path and 'on_rebase' in self.callbacks:
+            self.callbacks['on_rebase'](file_path)
+    
     def create_menu_items(self):
         menu_items = [
             { 'text': 'Open', 'command': self.open_file },
+            { 'text': 'Rebase', 'command': self.rebase_file },
             { 'text': 'RGB', 'command': lambda: self.callbacks.get('on_rgb', lambda: print("RGB clicked"))() },
             { 'text': 'GrayScale', 'command': lambda: self.callbacks.get('on_gray_scale', lambda: print("GrayScale clicked"))() },
+            { 'text': 'Threshold', 'command': lambda: self.callbacks.get('on_live_operation', lambda name: print("Threshold clicked"))("Threshold") },
+            { 'text': 'Blur', 'command': lambda: self.callbacks.get('on_live_operation', lambda name: print("Blur clicked"))("Blur") },
+            { 'text': 'Sketch', 'command': lambda: self.callbacks.get('on_live_operation', lambda name: print("Sketch clicked"))("Sketch") },
+            { 'text': 'Cancel', 'command': lambda: self.callbacks.get('on_cancel', lambda: print("Cancel clicked"))() },
             { 'text': 'Settings', 'command': lambda: self.callbacks.get('on_settings', lambda: print("Settings clicked"))() },
             { 'text': 'Help', 'command': lambda: self.callbacks.get('on_help', lambda: print("Help clicked"))() }
         ]
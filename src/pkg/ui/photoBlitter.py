@@ -0,0 +1,64 @@
+from PIL import Image, ImageTk
+
+from ..core.renderUtils import render_fit
+
+
+class PhotoBlitter:
+    """
+    Keeps one persistent Tk photo for a preview and writes frames into it in place.
+
+    The fitted frame is resized into a reused buffer and pasted into the
+    existing photo. PIL only shares memory with 1 and 4 byte pixel layouts,
+    so a frame costs the resize write, PIL unpacking the RGB buffer into its
+    4 byte pixels and the copy of those into Tk. A new photo is only
+    allocated when the fitted size changes.
+    """
+    def __init__(self):
+        self.photo = None
+        self.buffer = None
+        self.frames = 0
+        self.bytes_copied = 0
+        self.last_frame_bytes = 0
+        self.photo_allocations = 0
+
+    def blit(self, rgb, container_w: int, container_h: int):
+        """
+        Render an RGB buffer fitted to the container into the persistent photo
+
+        Returns:
+            ImageTk.PhotoImage: the photo to show, same object while the size is unchanged
+        """
+        return self.show(render_fit(rgb, container_w, container_h, dst=self.buffer))
+
+    def show(self, fitted):
+        """
+        Write an already fitted RGB buffer into the persistent photo, the blitter keeps and reuses the buffer
+
+        Returns:
+            ImageTk.PhotoImage: the photo to show, same object while the size is unchanged
+        """
+        self.buffer = fitted
+        h, w = self.buffer.shape[:2]
+        frame = Image.frombuffer("RGB", (w, h), self.buffer, "raw", "RGB", 0, 1)
+        if self.photo is None or (self.photo.width(), self.photo.height()) != (w, h):
+            self.photo = ImageTk.PhotoImage(frame)
+            self.photo_allocations += 1
+        else:
+            self.photo.paste(frame)
+        # resize output written into the buffer, unpacked by PIL to 4 bytes per pixel, then copied into Tk
+        self.last_frame_bytes = self.buffer.nbytes + 2 * w * h * 4
+        self.bytes_copied += self.last_frame_bytes
+        self.frames += 1
+        return self.photo
+
+    def release(self):
+        self.photo = None
+        self.buffer = None
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "bytes_copied": self.bytes_copied,
+            "last_frame_bytes": self.last_frame_bytes,
+            "photo_allocations": self.photo_allocations,
+        }
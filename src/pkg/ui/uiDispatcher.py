@@ -0,0 +1,36 @@
+import queue
+
+
+class UiDispatcher:
+    """Runs callbacks posted from worker threads on the Tk main loop"""
+    def __init__(self, root, interval: int = 15, batch: int = 64):
+        self.root = root
+        self.interval = interval
+        self.batch = batch
+        self.queue = queue.Queue()
+        self.root.after(self.interval, self._poll)
+
+    def post(self, callback, *args):
+        """Schedule callback(*args) on the Tk thread, safe to call from any thread"""
+        self.queue.put((callback, args))
+
+    def _poll(self):
+        try:
+            for _ in range(self.batch):
+                try:
+                    callback, args = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                callback(*args)
+        finally:
+            self.root.after(self.interval, self._poll)
+
+
+def get_dispatcher(widget) -> UiDispatcher:
+    """Get the dispatcher bound to the widget's Tk root, creating it on first use"""
+    root = widget._root()
+    dispatcher = getattr(root, "_ui_dispatcher", None)
+    if dispatcher is None:
+        dispatcher = UiDispatcher(root)
+        root._ui_dispatcher = dispatcher
+    return dispatcher
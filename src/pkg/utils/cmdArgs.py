@@ -2,13 +2,29 @@ import argparse
 
 cmdArgs = {}
 
-def getArgs():
+def getArgs(argv=None):
     parser = argparse.ArgumentParser()
 
     parser.add_argument("--theme", type=str, help="Theme of the app")
     parser.add_argument("--dpx", type=str, help="Enter dp id")
+    parser.add_argument("--compress-history", action="store_true", help="Keep cold history buffers compressed in memory")
+    parser.add_argument("--hot-buffers", type=int, default=8, help="Number of uncompressed history buffers kept hot")
+    parser.add_argument("--workers", type=int, help="Background worker threads, defaults to the CPU count")
+    parser.add_argument("--batch-workers", type=int, help="Workers background and batch jobs may occupy")
+    parser.add_argument("--cv-threads", type=int, help="Threads OpenCV may use inside a single operation")
+    parser.add_argument("--memory-budget", type=int, help="MiB a single opened image may take, defaults to a quarter of the RAM")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on localhost at this port")
+    parser.add_argument("--metrics-file", type=str, help="Periodically write Prometheus metrics to this file")
+    parser.add_argument("--metrics-interval", type=float, default=15.0, help="Seconds between metrics file dumps")
+    parser.add_argument("--record", type=str, help="Record the GUI session actions and timings to this JSON lines file")
+    parser.add_argument("--watch", type=str, help="Run headless, processing images dropped into this folder")
+    parser.add_argument("--recipe", type=str, help="Recipe file applied in watch mode")
+    parser.add_argument("--output", type=str, help="Output folder for watch mode")
+    parser.add_argument("--ledger", type=str, help="Ledger file for watch mode, defaults to <output>/.ledger.jsonl")
+    parser.add_argument("--queue-size", type=int, default=64, help="Files queued or running at once in watch mode")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between watch folder scans")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     cmdArgs["args"] = args
     print(f"{cmdArgs = }")
     return args
@@ -1,6 +1,13 @@
 import os
+import time
 import cv2
 
+from pkg.core.metrics import MetricsRegistry
+
+EXPORTS_TOTAL = MetricsRegistry().counter("i2c_exports_total", "Images written, by outcome", ("status",))
+EXPORT_BYTES = MetricsRegistry().counter("i2c_export_bytes_total", "Encoded bytes written")
+EXPORT_SECONDS = MetricsRegistry().histogram("i2c_export_duration_seconds", "Time spent encoding and writing an image")
+
 def createOutputFolder(destination):
     if not os.path.exists(destination):
         os.makedirs(destination, exist_ok=True)
@@ -17,4 +24,10 @@ def saveImage(image, file_path = "image.png"):
     if not os.path.exists(os.path.dirname(file_path)):
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
     
-    cv2.imwrite(file_path, image)  # Assuming cv2 is already imported in the context where this function is used
\ No newline at end of file
+    started = time.perf_counter()
+    if not cv2.imwrite(file_path, image):
+        EXPORTS_TOTAL.inc(1, "failed")
+        raise ValueError(f"Unable to write {file_path}")
+    EXPORTS_TOTAL.inc(1, "ok")
+    EXPORT_BYTES.inc(os.path.getsize(file_path))
+    EXPORT_SECONDS.observe(time.perf_counter() - started)
\ No newline at end of file